@@ -0,0 +1,220 @@
+
+import asyncio
+import os
+import re
+from symbol_index import SymbolIndex
+from reply_cache import ReplyCache
+from data_snapshot import DataSnapshotManager
+from snapshot_format import build_snapshot, open_snapshot, snapshot_version
+from market_indicator_fetcher import get_market_snapshot, get_market_snapshot_async, delay_note, format_yield
+from command_router import CommandRouter
+from subscriber_store import SubscriberStore
+
+try:
+    import resource
+except ImportError:  # Windows 沒有 resource，就不回報 max_rss_kb
+    resource = None
+
+# v27.1（Flask）與 v28（ASGI）共用的資料載入與回覆內容，兩邊的指令與訊息完全一樣
+
+SIGNAL_FILE = os.environ.get("SIGNAL_FILE", "daily_signals.csv")
+BACKTEST_FILE = os.environ.get("BACKTEST_FILE", "backtest_summary.csv")
+# 設定 DATA_SNAPSHOT_FILE 後改讀 snapshot_format.py 產生的二進位快照（mmap，不經 pandas），
+# 冷啟動不用 import pandas；檔案不存在就先用 csv 模組從 SIGNAL_FILE / BACKTEST_FILE 建一份
+DATA_SNAPSHOT_FILE = os.environ.get("DATA_SNAPSHOT_FILE")
+# 傳過訊息的使用者記在 SQLite（SUBSCRIBERS_DB），line_broadcast_sender.py 推播用；
+# 舊的 subscribers.txt 在資料庫第一次建立時匯入
+SUBSCRIBERS_DB = os.environ.get("SUBSCRIBERS_DB", "subscribers.db")
+SUBSCRIBERS_FILE = os.environ.get("SUBSCRIBERS_FILE", "subscribers.txt")
+# 每位使用者關注清單的上限檔數
+WATCHLIST_MAX = int(os.environ.get("WATCHLIST_MAX", 20))
+
+def load_data():
+    import pandas as pd
+
+    signal_df = pd.read_csv(SIGNAL_FILE)
+    backtest_df = pd.read_csv(BACKTEST_FILE)
+
+    symbol_col = "Symbol" if "Symbol" in backtest_df.columns else "symbol"
+    backtest_df[symbol_col] = backtest_df[symbol_col].str.upper()
+    backtest_df["win"] = backtest_df["Return"] > 0
+    win_rate_df = backtest_df.groupby(symbol_col)["win"].mean().reset_index()
+    win_rate_df["win_rate"] = (win_rate_df["win"] * 100).round(2)
+    win_rate_df.drop(columns=["win"], inplace=True)
+
+    signal_df["Symbol"] = signal_df["Symbol"].str.upper()
+    return SymbolIndex.from_frames(signal_df, win_rate_df, symbol_col)
+
+# 每 DATA_RELOAD_SECONDS 秒檢查資料檔，有更新就在背景重建、整包換掉，不用重啟（0 = 不監看）
+if DATA_SNAPSHOT_FILE:
+    if not os.path.exists(DATA_SNAPSHOT_FILE):
+        build_snapshot(SIGNAL_FILE, BACKTEST_FILE, DATA_SNAPSHOT_FILE)
+    data_manager = DataSnapshotManager(
+        [DATA_SNAPSHOT_FILE],
+        lambda: open_snapshot(DATA_SNAPSHOT_FILE),
+        interval=float(os.environ.get("DATA_RELOAD_SECONDS", 30)),
+        on_swap=lambda snap: reply_cache.rendered(snap.data),
+        version=lambda paths: snapshot_version(paths[0]),
+    )
+else:
+    data_manager = DataSnapshotManager(
+        [SIGNAL_FILE, BACKTEST_FILE],
+        load_data,
+        interval=float(os.environ.get("DATA_RELOAD_SECONDS", 30)),
+        on_swap=lambda snap: reply_cache.rendered(snap.data),
+    )
+
+def generate_market_summary():
+    try:
+        return format_market_summary(get_market_snapshot())
+    except Exception as e:
+        return f"❗ 無法取得市場資訊：{e}"
+
+async def generate_market_summary_async():
+    try:
+        return format_market_summary(await get_market_snapshot_async())
+    except Exception as e:
+        return f"❗ 無法取得市場資訊：{e}"
+
+def format_market_summary(snap):
+    def close(symbol):
+        price = snap.quote(symbol).price
+        if price is None:
+            raise ValueError(snap.errors.get(symbol, f"{symbol} 無資料"))
+        return price
+    spx = close("^GSPC")
+    ndx = close("^IXIC")
+    vix = close("^VIX")
+    dxy = close("DX-Y.NYB")
+    close("^TNX")  # 殖利率缺資料時也和其他指標一樣回錯誤
+    tn = format_yield(snap.quote("^TNX"))
+    return f"""📊 今日市場概況：
+S&P500：{spx:.2f}
+NASDAQ：{ndx:.2f}
+VIX：{vix:.2f}
+DXY：{dxy:.2f}
+10Y殖利率：{tn}
+""" + delay_note(snap)
+
+def render_stock_summary(row):
+    return f"""📊 {row.symbol} 分析：
+技術評估：{row.signal}
+回測勝率：{row.win_rate}%
+"""
+
+def render_winrate_summary(row):
+    return f"{row.symbol} 勝率為 {row.win_rate}%"
+
+def render_top3(index):
+    return "🏆 回測前三名：\n" + "\n".join([f"{i+1}. {s} - {r:.1f}%" for i, (s, r) in enumerate(index.top(3))])
+
+# 個股回覆與排行榜在資料載入時就全部組好，資料版本變了才重建
+reply_cache = ReplyCache(
+    {"stock": render_stock_summary, "winrate": render_winrate_summary},
+    {"top3": render_top3},
+)
+reply_cache.rendered(data_manager.current.data)
+data_manager.start()
+
+def generate_stock_summary(symbol, raw):
+    index = data_manager.current.data
+    reply = reply_cache.symbol_reply(index, "stock", symbol)
+    if reply is None:
+        preview = "、".join(index.symbols[:10])
+        return f"""❗ 查詢失敗
+輸入文字：{raw}
+轉換代碼：{symbol}
+目前可查前10名：{preview}
+"""
+    return reply
+
+def generate_winrate_summary(symbol):
+    reply = reply_cache.symbol_reply(data_manager.current.data, "winrate", symbol)
+    if reply is None:
+        return f"查無勝率資料：{symbol}"
+    return reply
+
+def generate_top3():
+    return reply_cache.static_reply(data_manager.current.data, "top3")
+
+# 已知的使用者只查記憶體裡的 set；新使用者每 SUBSCRIBERS_FLUSH_SECONDS 秒批次寫入
+subscriber_store = SubscriberStore(
+    SUBSCRIBERS_DB,
+    flush_interval=float(os.environ.get("SUBSCRIBERS_FLUSH_SECONDS", 5)),
+    legacy_file=SUBSCRIBERS_FILE,
+).start()
+
+def add_subscribers(user_ids):
+    subscriber_store.add(user_ids)
+
+def render_watchlist(symbols):
+    if not symbols:
+        return "你還沒有設定關注清單，輸入「關注 AAPL TSLA」設定，每日推播就只會包含這些股票"
+    return "⭐ 你的關注清單：" + "、".join(symbols)
+
+def watch_reply(cmd):
+    # 「關注 AAPL TSLA」設定（整份取代）、只打「關注」查看、「取消關注」清除、「取消關注 AAPL」移除其中幾檔；
+    # 回覆只和訊息文字有關，同一批裡傳同樣文字的使用者一起寫入
+    if not cmd.user_ids:
+        return "❗ 無法辨識使用者，請直接私訊機器人設定關注清單"
+    symbols = [s for s in re.split(r"[\s,，、]+", cmd.arg) if s]
+    if cmd.name == "unwatch":
+        if not symbols:
+            subscriber_store.set_watchlist(cmd.user_ids, [])
+            return "✅ 已清除關注清單，每日推播恢復預設內容"
+        # 每個人原本的清單不同，移除後各自寫回
+        return {
+            uid: render_watchlist(subscriber_store.set_watchlist(
+                [uid], [s for s in subscriber_store.watchlist(uid) if s not in symbols]))
+            for uid in cmd.user_ids
+        }
+    if not symbols:
+        return {uid: render_watchlist(subscriber_store.watchlist(uid)) for uid in cmd.user_ids}
+    index = data_manager.current.data
+    unknown = [s for s in symbols if s not in index]
+    if unknown:
+        return f"❗ 查無代碼：{'、'.join(unknown)}\n請確認後再輸入，例如：關注 AAPL TSLA"
+    if len(set(symbols)) > WATCHLIST_MAX:
+        return f"❗ 關注清單最多 {WATCHLIST_MAX} 檔"
+    return render_watchlist(subscriber_store.set_watchlist(cmd.user_ids, symbols))
+
+async def watch_reply_async(cmd):
+    # 關注清單直接讀寫 SQLite，非同步版丟到執行緒，不卡 event loop
+    return await asyncio.to_thread(watch_reply, cmd)
+
+def help_reply(cmd):
+    return f"請輸入：\n市場\n查詢 AAPL\n勝率 TSLA\n推薦前三名\n關注 AAPL TSLA\n取消關注 AAPL\n你輸入的是：{cmd.raw}"
+
+# 所有版本的指令集中在這張表：v23～v26 的別名（分析、today、大盤、推薦前3名…）都收進來，
+# 回覆內容以 v27.1 為準
+router = CommandRouter(fallback=help_reply)
+router.register(
+    "market", lambda cmd: generate_market_summary(),
+    exact=["市場", "MARKET", "TODAY", "大盤", "指數"],
+    keywords=["市場", "TODAY", "大盤"],
+    async_handler=lambda cmd: generate_market_summary_async(),
+)
+router.register("stock", lambda cmd: generate_stock_summary(cmd.arg, cmd.raw), prefixes=["查詢", "分析"])
+router.register("winrate", lambda cmd: generate_winrate_summary(cmd.arg), prefixes=["勝率"])
+router.register("top3", lambda cmd: generate_top3(), keywords=["前三", "前3"])
+router.register("watch", watch_reply, prefixes=["關注", "追蹤", "WATCH"], async_handler=watch_reply_async)
+router.register("unwatch", watch_reply, prefixes=["取消關注", "清除關注", "UNWATCH"], async_handler=watch_reply_async)
+router.register("help", help_reply, exact=["HI", "HELLO", "你好", "HELP", "指令"])
+
+def build_reply(raw_text, user_ids=()):
+    return router.dispatch(raw_text, user_ids)
+
+async def build_reply_async(raw_text, user_ids=()):
+    return await router.dispatch_async(raw_text, user_ids)
+
+def data_summary():
+    # 多 worker 時每個 worker 各自回報，比較 pid / max_rss_kb 看記憶體有沒有隨 worker 數增加
+    return {
+        "symbols": len(data_manager.current.data),
+        "data": data_manager.stats(),
+        "replies": reply_cache.stats(),
+        "subscribers": subscriber_store.stats(),
+        "pid": os.getpid(),
+        "mapped": bool(DATA_SNAPSHOT_FILE),
+        "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource is not None else None,
+    }
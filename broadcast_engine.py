@@ -0,0 +1,371 @@
+
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from collections import deque, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+# LINE multicast 一次最多 500 個收件人；官方限制 multicast 每秒 200 個請求
+MULTICAST_SIZE = 500
+MULTICAST_PATH = "/v2/bot/message/multicast"
+
+BatchResult = namedtuple("BatchResult", ["index", "key", "size", "status", "attempts", "latency", "error", "group"], defaults=("",))
+
+
+class TokenBucket:
+    # 每秒補 rate 個 token，最多存 burst 個；acquire 拿不到就睡到下一個 token 補進來
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(rate, 1)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+        self.waited = 0.0
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                delay = (1 - self._tokens) / self.rate
+                self.waited += delay
+            time.sleep(delay)
+
+
+BatchRange = namedtuple("BatchRange", ["key", "group", "first", "last", "size"])
+
+
+def checkpoint_file(path, broadcast_id):
+    # 每個 broadcast_id 一個檔：output/broadcast_checkpoint.jsonl -> output/broadcast_checkpoint.daily-2026-10-18.jsonl，
+    # 開始推播時只讀這一次的紀錄，不會隨歷史推播變慢
+    root, ext = os.path.splitext(path)
+    return f"{root}.{re.sub(r'[^0-9A-Za-z._-]', '_', broadcast_id)}{ext or '.jsonl'}"
+
+
+class Checkpoint:
+    # 每批送出「前」先附加一行 start（組別、retry key、這批的完整名單），送完再附加 done。
+    # 重跑時開始了卻沒記到 done 的批次照原本的 key 與名單重送（LINE 若已收過會回 409）；
+    # 每組的 cursor 是已開始批次裡最大的 user_id，新的批次只從 cursor 之後的人排起，
+    # 名單中途有增減也不會改變已開始的批次。推播開始後才加入、排在 cursor 之前的人這次不會收到。
+    # 全部批次都完成後 compact 把檔案改寫成每組一行（cursor 與完成數），名單不再留在磁碟上。
+    def __init__(self, path, broadcast_id):
+        self.path = checkpoint_file(path, broadcast_id)
+        self.broadcast_id = broadcast_id
+        self._lock = threading.Lock()
+        self.started = {}
+        self.done = set()
+        self.cursors = {}
+        self.completed = {}  # compact 過的組別：group -> (批次數, 人數)
+        self.pending_ids = {}  # 只留還沒完成的批次名單，已完成的讀到 done 就丟掉
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # 當機時寫一半的最後一行
+                    if entry.get("broadcast") != broadcast_id:
+                        continue
+                    if entry.get("event") == "start":
+                        self._started(BatchRange(entry["key"], entry["group"], entry["first"], entry["last"], entry["size"]))
+                        self.pending_ids[entry["key"]] = entry["ids"]
+                    elif entry.get("event") == "done":
+                        self.done.add(entry["key"])
+                        self.pending_ids.pop(entry["key"], None)
+                    elif entry.get("event") == "complete":
+                        self.completed[entry["group"]] = (entry["batches"], entry["users"])
+                        self.cursors[entry["group"]] = entry["cursor"]
+
+    def _started(self, r):
+        self.started[r.key] = r
+        if r.group not in self.cursors or r.last > self.cursors[r.group]:
+            self.cursors[r.group] = r.last
+
+    def _append(self, entry):
+        line = json.dumps({"broadcast": self.broadcast_id, "at": time.time(), **entry})
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+    def start(self, r, batch):
+        self._append({"event": "start", **r._asdict(), "ids": batch})
+        self._started(r)
+
+    def mark(self, result):
+        self._append({"event": "done", "key": result.key, "status": result.status})
+        with self._lock:
+            self.done.add(result.key)
+
+    def finished(self, group):
+        # 這組已完成的批次數與人數
+        ranges = [r for r in self.started.values() if r.group == group and r.key in self.done]
+        batches, users = self.completed.get(group, (0, 0))
+        return batches + len(ranges), users + sum(r.size for r in ranges)
+
+    def compact(self):
+        # 還有沒完成的批次就不動（重跑要用到名單）；全部完成就換成每組一行的摘要
+        with self._lock:
+            if any(key not in self.done for key in self.started):
+                return False
+            groups = dict(self.completed)
+            for r in self.started.values():
+                batches, users = groups.get(r.group, (0, 0))
+                groups[r.group] = (batches + 1, users + r.size)
+            tmp = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                for group, (batches, users) in groups.items():
+                    f.write(json.dumps({
+                        "broadcast": self.broadcast_id, "at": time.time(), "event": "complete", "group": group,
+                        "cursor": self.cursors[group], "batches": batches, "users": users,
+                    }) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+            self.completed, self.started, self.done, self.pending_ids = groups, {}, set(), {}
+            return True
+
+    def unfinished(self, group):
+        return sorted((r for r in self.started.values() if r.group == group and r.key not in self.done), key=lambda r: r.first)
+
+
+def batch_key(broadcast_id, group, batch):
+    # 只要同一次推播裡不重複就好：重跑時已開始的批次沿用 checkpoint 記下的 key，
+    # 這把 key 也是 X-Line-Retry-Key，當機前其實已送出的批次重送時 LINE 會回 409，不會重複發送
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"{broadcast_id}/{group}:{len(batch)}:{batch[0]}:{batch[-1]}"))
+
+
+def parse_retry_after(value):
+    # Retry-After 可以是秒數或 HTTP 日期；格式不對就回 None，改用指數退避
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            when = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=timezone.utc)
+        seconds = (when - datetime.now(timezone.utc)).total_seconds()
+    return max(seconds, 0.0) if math.isfinite(seconds) else None
+
+
+class BroadcastEngine:
+    # 分批 multicast：token bucket 限速、429 / 5xx / 連線錯誤指數退避重試、
+    # checkpoint 記錄完成的批次，重跑同一個 broadcast_id 會從中斷的地方接著送
+    def __init__(self, line_bot_api, checkpoint_path, rate=200, burst=None, concurrency=4,
+                 max_retries=5, base_delay=1.0, max_delay=60.0, batch_size=MULTICAST_SIZE):
+        self.api = line_bot_api
+        self.checkpoint_path = checkpoint_path
+        self.bucket = TokenBucket(rate, burst)
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=10000)
+        self.requests = 0
+        self.retries = 0
+        self.status_counts = {}
+
+    def _post(self, batch, messages, key):
+        headers = {"Content-Type": "application/json", **self.api.headers, "X-Line-Retry-Key": key}
+        data = json.dumps({"to": batch, "messages": [m.as_json_dict() for m in messages]})
+        return self.api.http_client.post(self.api.endpoint + MULTICAST_PATH, headers=headers, data=data)
+
+    def _backoff(self, attempt, retry_after=None):
+        delay = parse_retry_after(retry_after)
+        if delay is not None:
+            return min(delay, self.max_delay)
+        return min(self.base_delay * 2 ** attempt, self.max_delay) * random.uniform(0.5, 1.0)
+
+    def _record(self, status, latency):
+        with self._lock:
+            self.requests += 1
+            self.status_counts[status] = self.status_counts.get(status, 0) + 1
+            self._latencies.append(latency)
+
+    def send_batch(self, index, key, batch, messages):
+        start = time.monotonic()
+        error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                with self._lock:
+                    self.retries += 1
+            self.bucket.acquire()
+            t = time.monotonic()
+            retry_after = None
+            try:
+                resp = self._post(batch, messages, key)
+                status = resp.status_code
+                if status == 429:
+                    retry_after = resp.headers.get("Retry-After")
+            except Exception as e:
+                # 連線錯誤、逾時：不知道 LINE 有沒有收到，靠 retry key 安全重送
+                status, error = "network", str(e)
+            self._record(status, time.monotonic() - t)
+            if status != "network":
+                if 200 <= status < 300:
+                    return BatchResult(index, key, len(batch), "sent", attempt + 1, time.monotonic() - start, None)
+                if status == 409:
+                    # 同一把 retry key 之前已經被接受
+                    return BatchResult(index, key, len(batch), "accepted", attempt + 1, time.monotonic() - start, None)
+                error = f"HTTP {status}"
+                if status != 429 and status < 500:
+                    break
+            if attempt < self.max_retries:
+                time.sleep(self._backoff(attempt, retry_after))
+        return BatchResult(index, key, len(batch), "failed", attempt + 1, time.monotonic() - start, error)
+
+    def run(self, broadcast_id, user_ids, messages, on_result=None):
+        # 所有人收到同一份訊息
+        return self.run_groups(broadcast_id, [("", user_ids, messages)], on_result)
+
+    def _plan(self, broadcast_id, group, user_ids, checkpoint):
+        # 把一組排成要送的 (BatchRange, 名單)：先重送上次開始了卻沒完成的批次（原本的 key 與名單），
+        # 再從 cursor 之後照常每 batch_size 人一批。user_ids 必須依 user_id 遞增
+        for r in checkpoint.unfinished(group):
+            yield r, checkpoint.pending_ids[r.key]
+        cursor = checkpoint.cursors.get(group)
+        batch, prev = [], None
+        for uid in user_ids:
+            if prev is not None and uid <= prev:
+                raise ValueError(f"user_ids 必須依 user_id 遞增排列：{prev!r} 之後是 {uid!r}")
+            prev = uid
+            if cursor is not None and uid <= cursor:
+                continue
+            batch.append(uid)
+            if len(batch) == self.batch_size:
+                yield BatchRange(batch_key(broadcast_id, group, batch), group, batch[0], batch[-1], len(batch)), batch
+                batch = []
+        if batch:
+            yield BatchRange(batch_key(broadcast_id, group, batch), group, batch[0], batch[-1], len(batch)), batch
+
+    def run_groups(self, broadcast_id, groups, on_result=None):
+        # groups 是 (group_key, user_ids, messages) 的 iterable，可以邊產生邊送：
+        # 每組各自分批，全部排進同一個執行緒池；同時在途的批次不超過 concurrency * 2。
+        # 每組的 user_ids 要依 user_id 遞增（read_ids / read_watchlist_groups 都是），重跑才接得上
+        checkpoint = Checkpoint(self.checkpoint_path, broadcast_id)
+        start = time.monotonic()
+        first_send = None
+        results, skipped = [], 0
+        skipped_users = 0
+        group_count = 0
+        pending = set()
+
+        def send(index, r, batch, messages):
+            # 送成功就馬上寫 checkpoint（在工作執行緒裡），主程式中途當掉也不會漏記
+            result = self.send_batch(index, r.key, batch, messages)._replace(group=r.group)
+            if result.status != "failed":
+                checkpoint.mark(result)
+            return result
+
+        def collect(done):
+            for fut in done:
+                r = fut.result()
+                results.append(r)
+                if on_result is not None:
+                    on_result(r)
+
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="broadcast") as pool:
+            index = 0
+            for group, user_ids, messages in groups:
+                group_count += 1
+                done_batches, done_users = checkpoint.finished(group)
+                skipped += done_batches
+                skipped_users += done_users
+                for r, batch in self._plan(broadcast_id, group, user_ids, checkpoint):
+                    if len(pending) >= self.concurrency * 2:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        collect(done)
+                    if r.key not in checkpoint.started:
+                        # 先記下這批的 key 與名單再送，送到一半當掉重跑時照原樣重送
+                        checkpoint.start(r, batch)
+                    if first_send is None:
+                        first_send = time.monotonic() - start
+                    pending.add(pool.submit(send, index, r, batch, messages))
+                    index += 1
+            done, _ = wait(pending)
+            collect(done)
+        results.sort(key=lambda r: r.index)
+        checkpoint.compact()
+        summary = self.summary(results, skipped, skipped_users, time.monotonic() - start, first_send)
+        summary["groups"] = group_count
+        return summary
+
+    def summary(self, results, skipped, skipped_users, elapsed, first_send):
+        latencies = sorted(self._latencies)
+
+        def pct(p):
+            return latencies[min(int(len(latencies) * p), len(latencies) - 1)] if latencies else None
+
+        delivered = sum(r.size for r in results if r.status != "failed")
+        return {
+            "batches": len(results) + skipped,
+            "sent": sum(1 for r in results if r.status == "sent"),
+            "accepted_before": sum(1 for r in results if r.status == "accepted"),
+            "resumed_skip": skipped,
+            "failed": sum(1 for r in results if r.status == "failed"),
+            "recipients": delivered,
+            "recipients_skipped": skipped_users,
+            "recipients_failed": sum(r.size for r in results if r.status == "failed"),
+            "requests": self.requests,
+            "retries": self.retries,
+            "status_counts": {str(k): v for k, v in self.status_counts.items()},
+            "elapsed": elapsed,
+            "time_to_first_send": first_send,
+            "recipients_per_sec": delivered / elapsed if elapsed else None,
+            "requests_per_sec": self.requests / elapsed if elapsed else None,
+            "rate_limit_wait": self.bucket.waited,
+            "latency_avg": sum(latencies) / len(latencies) if latencies else None,
+            "latency_p50": pct(0.5),
+            "latency_p95": pct(0.95),
+            "latency_max": latencies[-1] if latencies else None,
+            "results": results,
+        }
+
+
+def format_result(r):
+    # 每批一行，給 run / run_groups 的 on_result 印進度用
+    group = f"〔{r.group}〕" if r.group else ""
+    head = f"第 {r.index + 1} 批{group}：{r.size} 人"
+    if r.status == "failed":
+        return f"❌ {head}，重試 {r.attempts} 次仍失敗（{r.latency:.2f}s）：{r.error}"
+    status = "已送出" if r.status == "sent" else "先前已被接受"
+    return f"✅ {head}，{status}，{r.attempts} 次（{r.latency:.2f}s）"
+
+
+def format_summary(s):
+    lines = [
+        f"📤 {s['recipients']} 人送達（{s['sent']} 批新送出、{s['accepted_before']} 批先前已被接受），"
+        f"{s['resumed_skip']} 批依 checkpoint 略過（{s['recipients_skipped']} 人），{s['failed']} 批失敗（{s['recipients_failed']} 人）",
+        f"⏱️ {s['elapsed']:.2f}s，{s['recipients_per_sec'] or 0:.0f} 人/s，{s['requests_per_sec'] or 0:.1f} 請求/s，"
+        f"限速等待 {s['rate_limit_wait']:.2f}s",
+        f"🔁 {s['requests']} 個請求、{s['retries']} 次重試，狀態碼：{s['status_counts']}",
+    ]
+    if s["time_to_first_send"] is not None:
+        lines[1] += f"，第一批送出於 {s['time_to_first_send']:.3f}s"
+    if s["latency_avg"] is not None:
+        lines.append(
+            f"📈 延遲 avg {s['latency_avg'] * 1000:.0f}ms / p50 {s['latency_p50'] * 1000:.0f}ms / "
+            f"p95 {s['latency_p95'] * 1000:.0f}ms / max {s['latency_max'] * 1000:.0f}ms"
+        )
+    for r in s["results"]:
+        if r.status == "failed":
+            lines.append(f"❌ 第 {r.index + 1} 批（{r.size} 人）重試 {r.attempts} 次仍失敗：{r.error}")
+    return "\n".join(lines)
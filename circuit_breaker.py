@@ -0,0 +1,64 @@
+
+import threading
+import time
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    # 連續失敗 failure_threshold 次就斷開，cooldown 秒內不再呼叫上游；
+    # 冷卻後放一個試探請求（half-open），成功才恢復
+    def __init__(self, failure_threshold=3, cooldown=60):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self.trips = 0
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            return "half_open"
+        return "open"
+
+    def is_open(self):
+        return self.state == "open"
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._probing or self.failures >= self.failure_threshold:
+                if self.opened_at is None or self._probing:
+                    self.trips += 1
+                self.opened_at = time.monotonic()
+            self._probing = False
+
+    def retry_in(self):
+        if self.opened_at is None:
+            return 0
+        return max(self.cooldown - (time.monotonic() - self.opened_at), 0)
+
+    def stats(self):
+        return {"state": self.state, "failures": self.failures, "trips": self.trips, "retry_in": self.retry_in()}
@@ -0,0 +1,111 @@
+
+import inspect
+import re
+import threading
+import time
+from collections import namedtuple
+
+from symbol_index import normalize_symbol
+
+# 一則訊息比對到的指令：text 是正規化後的全文，arg 是去掉前綴之後的參數，
+# user_ids 是傳這則訊息的使用者（同一批裡文字相同的訊息會一起處理）
+Command = namedtuple("Command", ["name", "raw", "text", "arg", "user_ids"], defaults=((),))
+
+_END = object()
+
+
+class CommandRouter:
+    # 指令表：全文比對用 dict、前綴用 trie、關鍵字用一條預先編好的 regex，
+    # 訊息只正規化一次（全形轉半形、去空白、轉大寫），比對成本和指令數量無關。
+    # 優先順序：全文 > 最長前綴 > 關鍵字（在訊息中出現最早的）> fallback
+    def __init__(self, fallback):
+        self._handlers = {}
+        self._async_handlers = {}
+        self._exact = {}
+        self._trie = {}
+        self._keywords = {}
+        self._keyword_re = None
+        self._lock = threading.Lock()
+        self._stats = {}
+        self.fallback = fallback
+
+    def register(self, name, handler, exact=(), prefixes=(), keywords=(), async_handler=None):
+        # handler(cmd) 回傳回覆文字，或 {user_id: 回覆} 讓每位使用者收到不同內容；async_handler 是非同步版（例如要等市場資料），沒給就用 handler
+        self._handlers[name] = handler
+        if async_handler is not None:
+            self._async_handlers[name] = async_handler
+        for word in exact:
+            self._exact[normalize_symbol(word)] = name
+        for word in prefixes:
+            node = self._trie
+            for ch in normalize_symbol(word):
+                node = node.setdefault(ch, {})
+            node[_END] = name
+        for word in keywords:
+            self._keywords[normalize_symbol(word)] = name
+        if self._keywords:
+            words = sorted(self._keywords, key=len, reverse=True)
+            self._keyword_re = re.compile("|".join(re.escape(w) for w in words))
+        self._stats[name] = {"calls": 0, "errors": 0, "total_time": 0.0, "max_time": 0.0}
+        return handler
+
+    def match(self, raw_text):
+        text = normalize_symbol(raw_text)
+        name = self._exact.get(text)
+        if name is not None:
+            return Command(name, raw_text, text, "")
+        node, found = self._trie, None
+        for i, ch in enumerate(text):
+            node = node.get(ch)
+            if node is None:
+                break
+            if _END in node:
+                found = (node[_END], i + 1)
+        if found is not None:
+            return Command(found[0], raw_text, text, text[found[1]:].strip())
+        if self._keyword_re is not None:
+            m = self._keyword_re.search(text)
+            if m is not None:
+                return Command(self._keywords[m.group()], raw_text, text, text)
+        return Command(None, raw_text, text, text)
+
+    def dispatch(self, raw_text, user_ids=()):
+        cmd = self.match(raw_text)._replace(user_ids=tuple(user_ids))
+        handler = self._handlers[cmd.name] if cmd.name is not None else self.fallback
+        start = time.perf_counter()
+        ok = False
+        try:
+            reply = handler(cmd)
+            ok = True
+            return reply
+        finally:
+            self._record(cmd.name, time.perf_counter() - start, ok)
+
+    async def dispatch_async(self, raw_text, user_ids=()):
+        cmd = self.match(raw_text)._replace(user_ids=tuple(user_ids))
+        handler = self.fallback if cmd.name is None else self._async_handlers.get(cmd.name, self._handlers[cmd.name])
+        start = time.perf_counter()
+        ok = False
+        try:
+            reply = handler(cmd)
+            if inspect.isawaitable(reply):
+                reply = await reply
+            ok = True
+            return reply
+        finally:
+            self._record(cmd.name, time.perf_counter() - start, ok)
+
+    def _record(self, name, elapsed, ok):
+        with self._lock:
+            s = self._stats.setdefault(name or "fallback", {"calls": 0, "errors": 0, "total_time": 0.0, "max_time": 0.0})
+            s["calls"] += 1
+            s["errors"] += 0 if ok else 1
+            s["total_time"] += elapsed
+            s["max_time"] = max(s["max_time"], elapsed)
+
+    def stats(self):
+        with self._lock:
+            return {
+                name: {**s, "avg_time": s["total_time"] / s["calls"] if s["calls"] else None}
+                for name, s in self._stats.items()
+            }
@@ -0,0 +1,103 @@
+
+import hashlib
+import os
+import threading
+import time
+from collections import namedtuple
+
+DataSnapshot = namedtuple("DataSnapshot", ["version", "data", "loaded_at", "build_time", "sources"])
+
+
+def _fingerprint(paths):
+    fp = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            fp.append((path, st.st_mtime_ns, st.st_size))
+        except FileNotFoundError:
+            fp.append((path, None, None))
+    return tuple(fp)
+
+
+def _content_version(paths):
+    h = hashlib.sha1()
+    for path in paths:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+    return h.hexdigest()[:12]
+
+
+class DataSnapshotManager:
+    # 監看輸出檔的 mtime / 大小，有變就在背景重建衍生資料，整包換掉 current；
+    # 請求一開始拿一次 current，整個請求都用同一版資料；on_swap 在換版前呼叫（例如預先產生回覆）
+    # version(paths) 預設對檔案內容算雜湊；資料檔自己帶版本時可以換掉，省下整檔讀取
+    def __init__(self, paths, build, interval=30, on_swap=None, version=_content_version):
+        self.paths = list(paths)
+        self.build = build
+        self.version = version
+        self.interval = interval
+        self.on_swap = on_swap
+        self._stop = threading.Event()
+        self._thread = None
+        self.reloads = 0
+        self.failures = 0
+        self.last_error = None
+        self.current = self._load(_fingerprint(self.paths))
+
+    def _load(self, fp):
+        version = self.version(self.paths)
+        start = time.perf_counter()
+        data = self.build()
+        return DataSnapshot(version, data, time.time(), time.perf_counter() - start, fp)
+
+    def check(self):
+        fp = _fingerprint(self.paths)
+        if fp == self.current.sources:
+            return False
+        try:
+            snap = self._load(fp)
+            # 建置途中檔案又被改寫（還沒寫完），下一輪再試
+            if _fingerprint(self.paths) != fp:
+                return False
+            if snap.version == self.current.version:
+                self.current = self.current._replace(sources=fp)
+                return False
+            # on_swap 失敗也算這次載入失敗：不換版，繼續用舊的資料，下一輪再試
+            if self.on_swap is not None:
+                self.on_swap(snap)
+        except Exception as e:
+            self.failures += 1
+            self.last_error = str(e)
+            print("❌ 資料重新載入失敗：", e)
+            return False
+        self.current = snap
+        self.reloads += 1
+        self.last_error = None
+        print(f"✅ 資料已更新：{snap.version}（{snap.build_time:.3f}s）")
+        return True
+
+    def start(self):
+        if self._thread is None and self.interval > 0:
+            self._thread = threading.Thread(target=self._run, name="data-reloader", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.check()
+
+    def stats(self):
+        snap = self.current
+        return {
+            "version": snap.version,
+            "loaded_at": snap.loaded_at,
+            "build_time": snap.build_time,
+            "reloads": self.reloads,
+            "failures": self.failures,
+            "last_error": self.last_error,
+            "interval": self.interval,
+        }
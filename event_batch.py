@@ -0,0 +1,52 @@
+
+from collections import defaultdict
+
+from linebot.models import MessageEvent, TextMessage
+
+
+class EventBatch:
+    # LINE 一次 POST 可能帶好幾個事件：body 只解析、驗章一次，
+    # 再依事件類型、使用者、訊息文字分組，同組的工作一起做
+    def __init__(self, events):
+        self.events = list(events)
+        self.by_type = defaultdict(list)
+        self.by_user = defaultdict(list)
+        self.by_text = defaultdict(list)
+        for event in self.events:
+            self.by_type[event.type].append(event)
+            user_id = getattr(event.source, "user_id", None)
+            if user_id:
+                self.by_user[user_id].append(event)
+            if isinstance(event, MessageEvent) and isinstance(event.message, TextMessage):
+                self.by_text[event.message.text].append(event)
+
+    @classmethod
+    def parse(cls, parser, body, signature):
+        return cls(parser.parse(body, signature))
+
+    @property
+    def user_ids(self):
+        return list(self.by_user)
+
+    def text_groups(self):
+        return list(self.by_text.values())
+
+
+def group_user_ids(events):
+    return [uid for uid in (getattr(e.source, "user_id", None) for e in events) if uid]
+
+
+def reply_for(reply, event):
+    # 回覆可以是所有人同一段文字，或依使用者各自不同（例如查自己的關注清單）
+    if isinstance(reply, dict):
+        return reply.get(getattr(event.source, "user_id", None), "")
+    return reply
+
+
+def reply_text_group(events, build_reply, send_reply):
+    # 同一批裡文字相同的訊息只產生一次回覆，再分別用各自的 reply token 回
+    reply = build_reply(events[0].message.text, group_user_ids(events))
+    for event in events:
+        text = reply_for(reply, event)
+        if text:
+            send_reply(event.reply_token, text)
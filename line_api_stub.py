@@ -0,0 +1,127 @@
+
+import argparse
+import json
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 本機模擬 LINE Messaging API 的 multicast / push，測推播引擎用：
+#   python line_api_stub.py --port 8090 --rate 50 --error-rate 0.05 --latency 0.02
+#   LINE_API_ENDPOINT=http://127.0.0.1:8090 YOUR_CHANNEL_ACCESS_TOKEN=x python line_broadcast_sender.py
+# 超過 --rate 回 429、依 --error-rate 隨機回 500；同一把 X-Line-Retry-Key 第二次送來回 409。
+# GET /stats 看每個 user 實際收到幾次（有人收到兩次就是重複發送）。
+
+
+class StubState:
+    def __init__(self, rate=0, error_rate=0.0, latency=0.0):
+        self.rate = rate
+        self.error_rate = error_rate
+        self.latency = latency
+        self._lock = threading.Lock()
+        self._window = []
+        self.accepted_keys = {}
+        self.deliveries = Counter()
+        self.status_counts = Counter()
+
+    def handle(self, payload, retry_key):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            now = time.monotonic()
+            if self.rate:
+                self._window = [t for t in self._window if now - t < 1]
+                if len(self._window) >= self.rate:
+                    self.status_counts[429] += 1
+                    return 429, {"message": "The API rate limit has been exceeded. Try again later."}, {}
+                self._window.append(now)
+            if retry_key and retry_key in self.accepted_keys:
+                self.status_counts[409] += 1
+                return 409, {"message": "The retry key is already accepted"}, {
+                    "X-Line-Accepted-Request-Id": self.accepted_keys[retry_key]
+                }
+            if random.random() < self.error_rate:
+                self.status_counts[500] += 1
+                return 500, {"message": "Internal server error"}, {}
+            to = payload.get("to")
+            for uid in to if isinstance(to, list) else [to]:
+                self.deliveries[uid] += 1
+            request_id = f"stub-{sum(self.status_counts.values())}"
+            if retry_key:
+                self.accepted_keys[retry_key] = request_id
+            self.status_counts[200] += 1
+            return 200, {}, {"X-Line-Request-Id": request_id}
+
+    def stats(self):
+        with self._lock:
+            times = Counter(self.deliveries.values())
+            return {
+                "users": len(self.deliveries),
+                "deliveries": sum(self.deliveries.values()),
+                "duplicated_users": sum(n for k, n in times.items() if k > 1),
+                "status_counts": {str(k): v for k, v in self.status_counts.items()},
+            }
+
+
+def make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def _send(self, status, body, headers=None):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            try:
+                self.wfile.write(data)
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # 客戶端送出後就被砍了（測中途當機時會這樣），請求本身已經算進去
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            body = self.rfile.read(length)
+            if self.path not in ("/v2/bot/message/multicast", "/v2/bot/message/push"):
+                self._send(404, {"message": "Not found"})
+                return
+            self._send(*state.handle(json.loads(body or b"{}"), self.headers.get("X-Line-Retry-Key")))
+
+        def do_GET(self):
+            if self.path == "/stats":
+                self._send(200, state.stats())
+            else:
+                self._send(404, {"message": "Not found"})
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def start(port=0, rate=0, error_rate=0.0, latency=0.0):
+    # 在背景執行緒啟動，回傳 server（server.state 是 StubState，server.server_port 是實際埠號）
+    state = StubState(rate, error_rate, latency)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(state))
+    server.daemon_threads = True
+    server.state = state
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="本機 LINE API 模擬伺服器")
+    ap.add_argument("--port", type=int, default=8090)
+    ap.add_argument("--rate", type=int, default=0, help="每秒最多接受幾個請求，超過回 429（0 = 不限）")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="隨機回 500 的比例")
+    ap.add_argument("--latency", type=float, default=0.0, help="每個請求額外延遲秒數")
+    args = ap.parse_args()
+    server = start(args.port, args.rate, args.error_rate, args.latency)
+    print(f"✅ LINE API stub 在 http://127.0.0.1:{server.server_port}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        print(json.dumps(server.state.stats(), ensure_ascii=False))
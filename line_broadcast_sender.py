@@ -1,42 +1,103 @@
-
 from linebot import LineBotApi
 from linebot.models import TextSendMessage
-import os, pandas as pd, yfinance as yf
+import os, math
+from datetime import datetime
+from itertools import groupby
+from operator import itemgetter
+import trading_calendar
+from market_indicator_fetcher import get_fresh_market_snapshot, format_price_change, format_yield, delay_note
+from line_http_client import get_http_client
+from subscriber_store import init_db, read_watchlist_groups
+from snapshot_format import build_snapshot, open_snapshot
+from broadcast_engine import MULTICAST_SIZE, BroadcastEngine, format_result, format_summary
+
+SUBSCRIBERS_DB = os.environ.get("SUBSCRIBERS_DB", "subscribers.db")
+SIGNAL_FILE = os.environ.get("SIGNAL_FILE", "output/daily_signals.csv")
+BACKTEST_FILE = os.environ.get("BACKTEST_FILE", "output/backtest_summary.csv")
+DATA_SNAPSHOT_FILE = os.environ.get("DATA_SNAPSHOT_FILE", "output/data_snapshot.bin")
+
+# 同時送出的批次數由 MULTICAST_CONCURRENCY 控制；BROADCAST_RATE 是每秒請求上限（LINE multicast 限制 200/s）
+MULTICAST_CONCURRENCY = int(os.environ.get("MULTICAST_CONCURRENCY", 4))
+BROADCAST_RATE = float(os.environ.get("BROADCAST_RATE", 200))
+BROADCAST_MAX_RETRIES = int(os.environ.get("BROADCAST_MAX_RETRIES", 5))
+# 實際檔名會加上 broadcast_id（output/broadcast_checkpoint.daily-YYYY-MM-DD.jsonl），送完後壓成每組一行
+BROADCAST_CHECKPOINT = os.environ.get("BROADCAST_CHECKPOINT", "output/broadcast_checkpoint.jsonl")
+# 指向 line_api_stub.py 就能在本機測試整個推播流程
+LINE_API_ENDPOINT = os.environ.get("LINE_API_ENDPOINT", LineBotApi.DEFAULT_API_ENDPOINT)
 
-def load_users():
-    if not os.path.exists("subscribers.txt"): return []
-    with open("subscribers.txt", "r") as f:
-        return list(set([line.strip() for line in f if line.strip()]))
+def load_groups():
+    # 邊讀資料庫邊送：(關注清單, user_id) 逐筆串流，同一份清單的人連在一起，沒設清單的（key 是 ""）在最後。
+    # 資料庫裡的 id 已經去重過（主鍵）；還沒有資料庫時從舊的 subscribers.txt 分批匯入
+    init_db(SUBSCRIBERS_DB, os.environ.get("SUBSCRIBERS_FILE", "subscribers.txt"))
+    return read_watchlist_groups(SUBSCRIBERS_DB)
+
+def load_index():
+    # 和 bot 同一份訊號 / 回測資料，用 csv 模組建快照，不需要 pandas
+    build_snapshot(SIGNAL_FILE, BACKTEST_FILE, DATA_SNAPSHOT_FILE)
+    return open_snapshot(DATA_SNAPSHOT_FILE)
 
 def get_market_summary():
+    snap = get_fresh_market_snapshot()
     def get(symbol):
-        info = yf.Ticker(symbol).info
-        p = info.get("regularMarketPrice", None)
-        c = info.get("regularMarketChangePercent", None)
-        return f"{p:.2f}（{c:+.2f}%）" if p and c else "資料不足"
+        return format_price_change(snap.quote(symbol))
     spx = get("^GSPC")
     ixic = get("^IXIC")
     vix = get("^VIX")
     dxy = get("DX-Y.NYB")
-    tnx = yf.Ticker("^TNX").info.get("regularMarketPrice", None)
-    tnx_str = f"{tnx:.2f}%" if tnx else "資料不足"
-    return f"📊 市場概況：\nS&P500：{spx}\nNASDAQ：{ixic}\nVIX：{vix}\nDXY：{dxy}\n10Y殖利率：{tnx_str}"
-
-def get_top3():
-    df = pd.read_csv("output/backtest_summary.csv")
-    df["Win"] = df["Return"] > 0
-    win = df.groupby("Symbol")["Win"].mean().reset_index()
-    win["WinRate(%)"] = (win["Win"] * 100).round(2)
-    top3 = win.sort_values("WinRate(%)", ascending=False).head(3)
-    return "🏆 回測前三名：\n" + "\n".join([f"{i+1}. {r.Symbol} - {r['WinRate(%)']:.1f}%" for i, r in top3.iterrows()])
+    tnx_str = format_yield(snap.quote("^TNX"))
+    today = datetime.now(trading_calendar.NEW_YORK).date()
+    title = "📊 市場概況：" if trading_calendar.is_trading_day(today) else "📊 市場概況（今日美股休市，為上一交易日收盤）："
+    return f"{title}\nS&P500：{spx}\nNASDAQ：{ixic}\nVIX：{vix}\nDXY：{dxy}\n10Y殖利率：{tnx_str}" + delay_note(snap)
+
+def get_top3(index):
+    return "🏆 回測前三名：\n" + "\n".join([f"{i+1}. {s} - {r:.1f}%" for i, (s, r) in enumerate(index.top(3))])
+
+def render_symbol(index, symbol):
+    row = index.get(symbol)
+    if row is None:
+        return f"{symbol}：今日無訊號資料"
+    rate = "—" if math.isnan(row.win_rate) else f"{row.win_rate:.1f}%"
+    return f"{row.symbol}：{row.signal}（收盤 {row.close:.2f}，回測勝率 {rate}）"
+
+class MessageRenderer:
+    # 每檔股票那一行只組一次、每份不同的關注清單只組一次訊息，
+    # 組訊息的成本和關注清單的種類數有關，和訂閱人數無關
+    def __init__(self, index, market_summary):
+        self.index = index
+        self.market_summary = market_summary
+        self.lines = {}
+        self.rendered = 0
+
+    def line(self, symbol):
+        if symbol not in self.lines:
+            self.lines[symbol] = render_symbol(self.index, symbol)
+        return self.lines[symbol]
+
+    def messages(self, key):
+        self.rendered += 1
+        if not key:
+            body = get_top3(self.index)
+        else:
+            body = "⭐ 你的關注清單：\n" + "\n".join(self.line(s) for s in key.split(","))
+        return [TextSendMessage(text=self.market_summary + "\n\n" + body)]
+
+def watchlist_groups(rows, renderer):
+    # 邊讀資料庫邊產生 (key, user_ids, messages)，一份清單的訊息在輪到它時才組
+    for key, group in groupby(rows, key=itemgetter(0)):
+        yield key, (uid for _, uid in group), renderer.messages(key)
 
 if __name__ == "__main__":
-    users = load_users()
-    msg = get_market_summary() + "\n\n" + get_top3()
-    line_bot_api = LineBotApi(os.environ["YOUR_CHANNEL_ACCESS_TOKEN"])
-    for uid in users:
-        try:
-            line_bot_api.push_message(uid, TextSendMessage(text=msg))
-            print("✅ sent to", uid)
-        except Exception as e:
-            print("❌", uid, e)
+    renderer = MessageRenderer(load_index(), get_market_summary())
+    # 同一天重跑會沿用同一個 BROADCAST_ID，從 checkpoint 接著送，已送過的批次不會重送
+    broadcast_id = os.environ.get("BROADCAST_ID") or f"daily-{datetime.now(trading_calendar.NEW_YORK).date()}"
+    line_bot_api = LineBotApi(os.environ["YOUR_CHANNEL_ACCESS_TOKEN"], endpoint=LINE_API_ENDPOINT, http_client=get_http_client())
+    engine = BroadcastEngine(
+        line_bot_api, BROADCAST_CHECKPOINT, rate=BROADCAST_RATE, concurrency=MULTICAST_CONCURRENCY,
+        max_retries=BROADCAST_MAX_RETRIES, batch_size=MULTICAST_SIZE,
+    )
+    # 每批送完就印一行結果（組別、人數、狀態、嘗試次數、延遲）
+    summary = engine.run_groups(broadcast_id, watchlist_groups(load_groups(), renderer), on_result=lambda r: print(format_result(r)))
+    print(f"📣 推播 {broadcast_id}：{summary['groups']} 種訊息（組了 {renderer.rendered} 次、{len(renderer.lines)} 檔個股）")
+    print(format_summary(summary))
+    # 整個推播共用同一組 keep-alive 連線
+    print("📈 LINE API：", line_bot_api.http_client.stats())
@@ -0,0 +1,232 @@
+
+import os
+import threading
+import time
+from collections import Counter, deque
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from linebot.http_client import HttpClient, HttpResponse, RequestsHttpClient, RequestsHttpResponse
+
+# LINE API 的對外連線：同一個 client 共用連線池與 keep-alive，不必每則訊息都重做 TLS 握手。
+# LINE_HTTP_BACKEND=requests（預設，HTTP/1.1）或 httpx（有裝 h2 就走 HTTP/2）
+BACKEND = os.environ.get("LINE_HTTP_BACKEND", "requests")
+POOL_SIZE = int(os.environ.get("LINE_HTTP_POOL_SIZE", 10))
+KEEPALIVE_SECONDS = float(os.environ.get("LINE_HTTP_KEEPALIVE", 60))
+
+
+class CallStats:
+    # 每次呼叫的延遲（保留最近 window 筆算百分位數）與新開連線數
+    def __init__(self, window=1000):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+        self.new_connections = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.http_versions = Counter()
+        self._latencies = deque(maxlen=window)
+
+    def record(self, latency, ok=True, new_connections=0, http_version=None):
+        with self._lock:
+            self.calls += 1
+            self.errors += 0 if ok else 1
+            self.new_connections += new_connections
+            self.total_latency += latency
+            self.max_latency = max(self.max_latency, latency)
+            self._latencies.append(latency)
+            if http_version:
+                self.http_versions[http_version] += 1
+
+    def stats(self, new_connections=None):
+        with self._lock:
+            latencies = sorted(self._latencies)
+            calls = self.calls
+            new = self.new_connections if new_connections is None else new_connections
+
+        def pct(p):
+            return latencies[min(int(len(latencies) * p), len(latencies) - 1)] if latencies else None
+
+        return {
+            "calls": calls,
+            "errors": self.errors,
+            "avg_latency": self.total_latency / calls if calls else None,
+            "p50_latency": pct(0.5),
+            "p95_latency": pct(0.95),
+            "max_latency": self.max_latency,
+            "new_connections": new,
+            "reuse_ratio": max(1 - new / calls, 0.0) if calls else None,
+            "http_versions": dict(self.http_versions),
+        }
+
+
+class PooledRequestsHttpClient(RequestsHttpClient):
+    # SDK 預設的 RequestsHttpClient 每次都呼叫 requests.post，不共用連線；
+    # 這裡改用一個 Session，連線池大小 POOL_SIZE
+    name = "requests"
+
+    def __init__(self, timeout=HttpClient.DEFAULT_TIMEOUT, pool_size=POOL_SIZE):
+        super().__init__(timeout)
+        self.session = requests.Session()
+        self.pool_size = pool_size
+        self._adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", self._adapter)
+        self.session.mount("http://", self._adapter)
+        self.call_stats = CallStats()
+        self._hosts = set()
+
+    def _request(self, method, url, timeout, **kwargs):
+        start = time.monotonic()
+        ok = False
+        try:
+            response = self.session.request(method, url, timeout=timeout or self.timeout, **kwargs)
+            ok = response.status_code < 500
+            return RequestsHttpResponse(response)
+        finally:
+            parts = urlsplit(url)
+            self._hosts.add(f"{parts.scheme}://{parts.netloc}")
+            self.call_stats.record(time.monotonic() - start, ok, http_version="HTTP/1.1")
+
+    def get(self, url, headers=None, params=None, stream=False, timeout=None):
+        return self._request("GET", url, timeout, headers=headers, params=params, stream=stream)
+
+    def post(self, url, headers=None, data=None, timeout=None):
+        return self._request("POST", url, timeout, headers=headers, data=data)
+
+    def delete(self, url, headers=None, data=None, timeout=None):
+        return self._request("DELETE", url, timeout, headers=headers, data=data)
+
+    def put(self, url, headers=None, data=None, timeout=None):
+        return self._request("PUT", url, timeout, headers=headers, data=data)
+
+    def stats(self):
+        # urllib3 每個 host 的連線池自己記錄開過幾條連線
+        opened = sum(self._adapter.poolmanager.connection_from_url(host).num_connections for host in list(self._hosts))
+        return {"backend": self.name, "pool_size": self.pool_size, **self.call_stats.stats(opened)}
+
+    def close(self):
+        self.session.close()
+
+
+class HttpxHttpResponse(HttpResponse):
+    def __init__(self, response):
+        self.response = response
+
+    @property
+    def status_code(self):
+        return self.response.status_code
+
+    @property
+    def headers(self):
+        return self.response.headers
+
+    @property
+    def text(self):
+        return self.response.text
+
+    @property
+    def content(self):
+        return self.response.content
+
+    @property
+    def json(self):
+        return self.response.json()
+
+    def iter_content(self, chunk_size=1024, decode_unicode=False):
+        if decode_unicode:
+            return self.response.iter_text(chunk_size)
+        return self.response.iter_bytes(chunk_size)
+
+
+class HttpxHttpClient(HttpClient):
+    # 有裝 h2 就用 HTTP/2，一條連線上多工送多個請求；沒有就退回 HTTP/1.1 keep-alive
+    name = "httpx"
+
+    def __init__(self, timeout=HttpClient.DEFAULT_TIMEOUT, pool_size=POOL_SIZE):
+        super().__init__(timeout)
+        import httpx
+
+        limits = httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size, keepalive_expiry=KEEPALIVE_SECONDS)
+        try:
+            self.client = httpx.Client(http2=True, limits=limits)
+            self.http2 = True
+        except ImportError:
+            self.client = httpx.Client(limits=limits)
+            self.http2 = False
+        self.pool_size = pool_size
+        self.call_stats = CallStats()
+
+    def _request(self, method, url, timeout, **kwargs):
+        opened = []
+
+        def trace(event, info):
+            if event == "connection.connect_tcp.complete":
+                opened.append(event)
+
+        start = time.monotonic()
+        response = None
+        try:
+            response = self.client.request(
+                method, url, timeout=timeout or self.timeout, extensions={"trace": trace}, **kwargs
+            )
+            return HttpxHttpResponse(response)
+        finally:
+            self.call_stats.record(
+                time.monotonic() - start,
+                response is not None and response.status_code < 500,
+                new_connections=len(opened),
+                http_version=response.http_version if response is not None else None,
+            )
+
+    def get(self, url, headers=None, params=None, stream=False, timeout=None):
+        return self._request("GET", url, timeout, headers=headers, params=params)
+
+    def post(self, url, headers=None, data=None, timeout=None):
+        return self._request("POST", url, timeout, headers=headers, content=data)
+
+    def delete(self, url, headers=None, data=None, timeout=None):
+        return self._request("DELETE", url, timeout, headers=headers, content=data)
+
+    def put(self, url, headers=None, data=None, timeout=None):
+        return self._request("PUT", url, timeout, headers=headers, content=data)
+
+    def stats(self):
+        return {"backend": self.name, "http2": self.http2, "pool_size": self.pool_size, **self.call_stats.stats()}
+
+    def close(self):
+        self.client.close()
+
+
+def get_http_client():
+    # 傳給 LineBotApi(http_client=...)，SDK 會用 timeout 建立實例，之後從 line_bot_api.http_client 拿統計
+    if BACKEND == "requests":
+        return PooledRequestsHttpClient
+    if BACKEND == "httpx":
+        return HttpxHttpClient
+    raise ValueError(f"未知的 LINE_HTTP_BACKEND：{BACKEND}")
+
+
+def aiohttp_trace_config(call_stats):
+    # 非同步版（aiohttp）用 TraceConfig 記錄同樣的延遲與新開連線數
+    import aiohttp
+
+    async def on_request_start(session, ctx, params):
+        ctx.start = time.monotonic()
+        ctx.new_connections = 0
+
+    async def on_connection_create_end(session, ctx, params):
+        ctx.new_connections = 1
+
+    async def on_request_end(session, ctx, params):
+        call_stats.record(time.monotonic() - ctx.start, params.response.status < 500, ctx.new_connections, "HTTP/1.1")
+
+    async def on_request_exception(session, ctx, params):
+        call_stats.record(time.monotonic() - ctx.start, False, ctx.new_connections)
+
+    config = aiohttp.TraceConfig()
+    config.on_request_start.append(on_request_start)
+    config.on_connection_create_end.append(on_connection_create_end)
+    config.on_request_end.append(on_request_end)
+    config.on_request_exception.append(on_request_exception)
+    return config
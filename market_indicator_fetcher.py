@@ -1,31 +1,345 @@
 
-import yfinance as yf
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+try:
+    import fcntl
+except ImportError:  # Windows 沒有 flock，就各自抓
+    fcntl = None
+
+import trading_calendar
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from quote_provider import Quote, get_provider
+from snapshot_cache import SnapshotCache
+
+# 市場指標：S&P500、NASDAQ、VIX、美元指數、10Y 殖利率
+INDICATORS = ["^GSPC", "^IXIC", "^VIX", "DX-Y.NYB", "^TNX"]
+
+# 整批抓取的時間上限（秒），單一指標的上限另計，超過就當作資料不足
+FETCH_TIMEOUT = float(os.environ.get("MARKET_FETCH_TIMEOUT", 8))
+QUOTE_TIMEOUT = float(os.environ.get("MARKET_QUOTE_TIMEOUT", 4))
+
+# 回覆訊息時最多等市場資料幾秒；reply token 約一分鐘就失效，要遠小於它
+REPLY_DEADLINE = float(os.environ.get("MARKET_REPLY_DEADLINE", 5))
+
+# 開盤時的快取秒數，過期後先回上一次的值並在背景更新；休市時沿用到下次開盤
+CACHE_TTL = float(os.environ.get("MARKET_CACHE_TTL", 60))
+
+# 報價來源由 QUOTE_PROVIDER 決定（yfinance / yahoo / replay）
+provider = get_provider()
+
+# 上游連續失敗就斷路，冷卻期間直接回最後一次成功的資料並標示延遲
+breaker = CircuitBreaker(
+    int(os.environ.get("MARKET_BREAKER_FAILURES", 3)),
+    float(os.environ.get("MARKET_BREAKER_COOLDOWN", 60)),
+)
+
+# 每次抓成功就寫到這個檔，重啟後先用它回覆，直到第一次即時更新完成
+SNAPSHOT_FILE = os.environ.get("MARKET_SNAPSHOT_FILE", "output/market_snapshot.json")
+
+TAIPEI = ZoneInfo("Asia/Taipei")
+
+
+class MarketSnapshot(namedtuple("MarketSnapshot", ["quotes", "fetched_at", "elapsed", "errors", "delayed"], defaults=(False,))):
+    __slots__ = ()
+
+    def quote(self, symbol):
+        return self.quotes.get(symbol) or Quote(symbol, None, None)
+
+
+# 五個指標同時抓，總耗時約等於最慢的那一檔
+_executor = ThreadPoolExecutor(max_workers=len(INDICATORS) * 2, thread_name_prefix="market")
+
+# 每個指標還在跑的那一次查詢。逾時的 future 取消不了（執行緒還卡在上游），
+# 上一次還沒結束就不再送新的，卡住的查詢最多每檔佔一條執行緒，不會把整個 pool 塞滿。
+# 非同步模式沒有原生 async 的來源也走這個 pool，不佔 event loop 的預設執行緒池（訂閱者寫入用的那個）
+_in_flight = {}
+_in_flight_lock = threading.Lock()
+
+
+_BUSY = "上一次查詢還沒結束"
+
+
+def _submit(symbol, fn):
+    with _in_flight_lock:
+        prev = _in_flight.get(symbol)
+        if prev is not None and not prev.done():
+            return None
+        fut = _in_flight[symbol] = _executor.submit(fn, symbol)
+    return fut
+
+
+def fetch_market_snapshot(symbols=INDICATORS, timeout=FETCH_TIMEOUT, quote_timeout=QUOTE_TIMEOUT):
+    start = time.monotonic()
+    deadline = start + timeout
+    started = {}
+
+    def fetch(symbol):
+        started[symbol] = time.monotonic()
+        return provider.get_quote(symbol)
+
+    futures, errors = {}, {}
+    for s in symbols:
+        fut = _submit(s, fetch)
+        if fut is None:
+            errors[s] = _BUSY
+        else:
+            futures[fut] = s
+    pending = set(futures)
+    while pending:
+        now = time.monotonic()
+        # 單一指標從開始跑起超過 quote_timeout 就放棄，不讓一檔拖住整批
+        pending = {f for f in pending if now - started.get(futures[f], now) < quote_timeout}
+        if not pending or now >= deadline:
+            break
+        # 還在排隊的指標開始跑之後才起算，所以這時候只短暫等一下
+        checks = [deadline] + [started[futures[f]] + quote_timeout if futures[f] in started else now + 0.05 for f in pending]
+        next_check = min(checks)
+        _, pending = wait(pending, timeout=next_check - now, return_when=FIRST_COMPLETED)
+
+    quotes = {}
+    for fut, symbol in futures.items():
+        if not fut.done():
+            fut.cancel()
+            errors[symbol] = f"逾時（{quote_timeout if symbol in started else timeout}s）"
+        elif fut.exception() is not None:
+            errors[symbol] = str(fut.exception())
+        else:
+            quotes[symbol] = fut.result()
+    return MarketSnapshot(quotes, time.time(), time.monotonic() - start, errors)
+
+
+@contextmanager
+def _fetch_lock(path):
+    # 跨行程的檔案鎖：同一時間只有一個 worker 打上游
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _snapshot_age(snap):
+    return max(time.time() - snap.fetched_at, 0)
+
+
+def _shared_snapshot():
+    # 其他 worker 已經寫到磁碟、還沒過期的快照
+    shared = load_snapshot()
+    if shared is not None and _snapshot_age(shared) < _snapshot_ttl(shared.fetched_at):
+        return shared
+    return None
+
+
+def _load_snapshot():
+    # gunicorn 多個 worker 共用磁碟上的快照：拿到鎖的去抓，其他的等它寫完直接讀回
+    with _fetch_lock(SNAPSHOT_FILE + ".lock"):
+        shared = _shared_snapshot()
+        if shared is not None:
+            return shared
+        _check_breaker()
+        return _record_result(fetch_market_snapshot())
+
+
+def _check_breaker():
+    if not breaker.allow():
+        raise CircuitOpenError(f"市場資料來源異常，{breaker.retry_in():.0f} 秒後再試")
+
+
+def _record_result(snap):
+    # 超過一半的指標失敗就算上游異常：丟例外，不放進快取也不寫磁碟，
+    # 快取繼續回上一次成功的資料並標示延遲（冷啟動沒有舊資料就回錯誤訊息）
+    if len(snap.errors) > len(snap.quotes):
+        breaker.record_failure()
+        print("❌ 市場指標讀取失敗：", snap.errors)
+        raise RuntimeError("市場指標讀取失敗：" + "；".join(f"{k} {v}" for k, v in snap.errors.items()))
+    breaker.record_success()
+    save_snapshot(snap)
+    return snap
+
+
+def save_snapshot(snap, path=SNAPSHOT_FILE):
+    # 先寫暫存檔再 rename，讀的人不會看到寫一半的檔案
+    data = {
+        "fetched_at": snap.fetched_at,
+        "elapsed": snap.elapsed,
+        "errors": snap.errors,
+        "quotes": {s: [q.price, q.change_pct, q.prev_close] for s, q in snap.quotes.items()},
+    }
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp, path)
+    except OSError as e:
+        print("❌ 市場快照寫入失敗：", e)
+
+
+def load_snapshot(path=SNAPSHOT_FILE):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        quotes = {s: Quote(s, *q) for s, q in data["quotes"].items()}
+        return MarketSnapshot(quotes, data["fetched_at"], data["elapsed"], data["errors"])
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        print("❌ 市場快照讀取失敗：", e)
+        return None
+
+
+def _snapshot_ttl(loaded_at):
+    return trading_calendar.snapshot_ttl(CACHE_TTL, datetime.fromtimestamp(loaded_at, trading_calendar.NEW_YORK))
+
+
+market_cache = SnapshotCache(_load_snapshot, _snapshot_ttl, age=_snapshot_age)
+
+# 用磁碟上的快照暖機；依抓取時間算有效期，過期的照樣先回，背景再更新
+_warm = load_snapshot()
+if _warm is not None:
+    market_cache.put(_warm, age=_snapshot_age(_warm))
+
+
+def get_market_snapshot(timeout=REPLY_DEADLINE):
+    try:
+        snap = market_cache.get(timeout)
+    except TimeoutError:
+        raise TimeoutError(f"市場資料超過 {timeout:g} 秒未回應") from None
+    if breaker.is_open() or market_cache.is_stale():
+        return snap._replace(delayed=True)
+    return snap
+
+
+def get_fresh_market_snapshot(timeout=FETCH_TIMEOUT * 2):
+    # 一次性的腳本（每日推播）用：當場同步更新一次，不先回開機時從磁碟暖機的舊值；
+    # 背景更新的 daemon 執行緒會隨腳本結束被砍掉，等不到。更新失敗才退回磁碟上的快照並標示延遲
+    try:
+        return market_cache.refresh(timeout)
+    except Exception as e:
+        snap = market_cache.peek()
+        if snap is None:
+            raise
+        print("❌ 市場資料更新失敗，改用上一次的快照：", e)
+        return snap._replace(delayed=True)
+
+
+async def _aget_quote(symbol):
+    if provider.native_async:
+        return await provider.aget_quote(symbol)
+    # yfinance 這類同步來源：和同步模式共用 _executor 與每檔一個在途的限制
+    fut = _submit(symbol, provider.get_quote)
+    if fut is None:
+        raise RuntimeError(_BUSY)
+    return await asyncio.wrap_future(fut)
+
+
+async def fetch_market_snapshot_async(symbols=INDICATORS, timeout=FETCH_TIMEOUT, quote_timeout=QUOTE_TIMEOUT):
+    # 和 fetch_market_snapshot 相同的逾時規則，但每個指標是一個 task，原生 async 的來源不佔執行緒
+    start = time.monotonic()
+    tasks = {asyncio.ensure_future(asyncio.wait_for(_aget_quote(s), quote_timeout)): s for s in symbols}
+    done, pending = await asyncio.wait(tasks, timeout=timeout)
+    for task in pending:
+        task.cancel()
+
+    quotes, errors = {}, {}
+    for task, symbol in tasks.items():
+        if task in pending:
+            errors[symbol] = f"逾時（{timeout}s）"
+        elif isinstance(task.exception(), asyncio.TimeoutError):
+            errors[symbol] = f"逾時（{quote_timeout}s）"
+        elif task.exception() is not None:
+            errors[symbol] = str(task.exception())
+        else:
+            quotes[symbol] = task.result()
+    return MarketSnapshot(quotes, time.time(), time.monotonic() - start, errors)
+
+
+async def _refresh_async():
+    # 非同步模式不拿檔案鎖（flock 會卡住 event loop），只先看有沒有別人抓好的
+    snap = _shared_snapshot()
+    if snap is None:
+        _check_breaker()
+        snap = _record_result(await fetch_market_snapshot_async())
+    market_cache.put(snap, _snapshot_age(snap))
+    return snap
+
+
+_async_refresh = None
+
+
+def _refresh_task():
+    # 同一個 event loop 裡同時只有一個更新在跑，其他請求等同一個 task
+    global _async_refresh
+    if _async_refresh is None or _async_refresh.done():
+        _async_refresh = asyncio.ensure_future(_refresh_async())
+        # 背景更新失敗時保留舊值，錯誤已經在 _record_result 記錄過
+        _async_refresh.add_done_callback(lambda t: t.cancelled() or t.exception())
+    return _async_refresh
+
+
+async def get_market_snapshot_async(timeout=REPLY_DEADLINE):
+    snap = market_cache.peek()
+    if snap is None or market_cache.is_stale():
+        task = _refresh_task()
+        if snap is None:
+            try:
+                snap = await asyncio.wait_for(asyncio.shield(task), timeout)
+            except asyncio.TimeoutError:
+                raise TimeoutError(f"市場資料超過 {timeout:g} 秒未回應") from None
+    if breaker.is_open() or market_cache.is_stale():
+        return snap._replace(delayed=True)
+    return snap
+
+
+def delay_note(snap):
+    if not snap.delayed:
+        return ""
+    fetched = datetime.fromtimestamp(snap.fetched_at, TAIPEI)
+    return f"\n⚠️ 報價延遲，資料時間 {fetched:%m/%d %H:%M}"
+
+
+def format_price_change(quote):
+    if quote.price is None or quote.change_pct is None:
+        return "資料不足"
+    return f"{quote.price:.2f}（{quote.change_pct:+.2f}%）"
+
+
+def format_yield(quote, percent="%"):
+    # ^TNX 的報價本身就是百分比（4.28 就是 4.28%），所有入口都用這裡的格式，不要再除以 10
+    if quote.price is None:
+        return "資料不足"
+    return f"{quote.price:.2f}{percent}"
+
 
 def fetch_market_indicators_v22():
     try:
-        def get_info(symbol):
-            return yf.Ticker(symbol).info
-
-        gspc = get_info("^GSPC")
-        ixic = get_info("^IXIC")
-        vix = get_info("^VIX")
-        dxy = get_info("DX-Y.NYB")
-        tnx = get_info("^TNX")
-
-        def format_item(name, info, unit=""):
-            price = info.get("regularMarketPrice", None)
-            change = info.get("regularMarketChangePercent", None)
-            if price is not None and change is not None:
-                return f"{name}：{price:.2f}（{change:+.2f}％）{unit}"
+        snap = get_market_snapshot()
+
+        def format_item(name, quote, unit=""):
+            if quote.price is not None and quote.change_pct is not None:
+                return f"{name}：{quote.price:.2f}（{quote.change_pct:+.2f}％）{unit}"
             return f"{name}：資料不足"
 
-        sp500 = format_item("S&P 500", gspc)
-        nasdaq = format_item("NASDAQ", ixic)
-        vix = format_item("VIX", vix)
-        dxy = format_item("美元指數 DXY", dxy)
+        sp500 = format_item("S&P 500", snap.quote("^GSPC"))
+        nasdaq = format_item("NASDAQ", snap.quote("^IXIC"))
+        vix = format_item("VIX", snap.quote("^VIX"))
+        dxy = format_item("美元指數 DXY", snap.quote("DX-Y.NYB"))
 
-        tnx_val = tnx.get("regularMarketPrice", None)
-        tnx_text = f"10Y 美債殖利率：{tnx_val:.2f}％" if tnx_val else "10Y 美債殖利率：資料不足"
+        tnx_text = "10Y 美債殖利率：" + format_yield(snap.quote("^TNX"), "％") + delay_note(snap)
 
         return sp500, nasdaq, vix, dxy, tnx_text
     except Exception as e:
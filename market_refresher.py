@@ -0,0 +1,72 @@
+
+import threading
+import time
+
+import trading_calendar
+
+
+class MarketRefresher:
+    # 背景定時更新市場快取，請求端只讀快取不打網路
+    # 開盤中每 interval 秒一次，休市時依交易日曆拉長到下次開盤
+    def __init__(self, cache, interval, schedule=trading_calendar.snapshot_ttl):
+        self.cache = cache
+        self.interval = interval
+        self.schedule = schedule
+        self._stop = threading.Event()
+        self._thread = None
+        self.runs = 0
+        self.failures = 0
+        self.last_started_at = None
+        self.last_success_at = None
+        self.last_latency = None
+        self.total_latency = 0.0
+        self.last_error = None
+        self.next_refresh_in = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="market-refresher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.refresh_once()
+            self.next_refresh_in = max(self.schedule(self.interval) - self.last_latency, 0)
+            self._stop.wait(self.next_refresh_in)
+
+    def refresh_once(self):
+        self.last_started_at = time.time()
+        start = time.monotonic()
+        try:
+            self.cache.refresh()
+            self.last_success_at = time.time()
+            self.last_error = None
+        except Exception as e:
+            self.failures += 1
+            self.last_error = str(e)
+            print("❌ 市場背景更新失敗：", e)
+        finally:
+            self.last_latency = time.monotonic() - start
+            self.total_latency += self.last_latency
+            self.runs += 1
+
+    def stats(self):
+        return {
+            "interval": self.interval,
+            "market_open": trading_calendar.is_market_open(),
+            "next_refresh_in": self.next_refresh_in,
+            "runs": self.runs,
+            "failures": self.failures,
+            "last_started_at": self.last_started_at,
+            "last_success_at": self.last_success_at,
+            "last_latency": self.last_latency,
+            "avg_latency": self.total_latency / self.runs if self.runs else None,
+            "last_error": self.last_error,
+            "cache_age": self.cache.age(),
+        }
@@ -0,0 +1,235 @@
+
+import asyncio
+import json
+import os
+import random
+import sys
+import threading
+import time
+import urllib.parse
+import urllib.request
+from collections import namedtuple
+
+Quote = namedtuple("Quote", ["symbol", "price", "change_pct", "prev_close"], defaults=(None,))
+
+
+def change_pct(price, prev_close):
+    if price is None or not prev_close:
+        return None
+    return (price / prev_close - 1) * 100
+
+
+class QuoteProvider:
+    # 報價來源介面：子類別實作 _fetch(symbol)，這裡統一記錄延遲
+    name = "base"
+    # 有自己非同步實作（_afetch）的來源設 True；沒有的（yfinance）由呼叫端丟到專用的執行緒池
+    native_async = False
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    def get_quote(self, symbol):
+        start = time.monotonic()
+        try:
+            return self._fetch(symbol)
+        except Exception:
+            self._record_error()
+            raise
+        finally:
+            self._record_latency(time.monotonic() - start)
+
+    async def aget_quote(self, symbol):
+        start = time.monotonic()
+        try:
+            return await self._afetch(symbol)
+        except Exception:
+            self._record_error()
+            raise
+        finally:
+            self._record_latency(time.monotonic() - start)
+
+    def _record_error(self):
+        with self._lock:
+            self.errors += 1
+
+    def _record_latency(self, latency):
+        with self._lock:
+            self.calls += 1
+            self.total_latency += latency
+            self.max_latency = max(self.max_latency, latency)
+
+    def _fetch(self, symbol):
+        raise NotImplementedError
+
+    async def _afetch(self, symbol):
+        # 沒有非同步版本的來源（yfinance）就丟到執行緒跑
+        return await asyncio.to_thread(self._fetch, symbol)
+
+    async def aclose(self):
+        pass
+
+    def stats(self):
+        return {
+            "provider": self.name,
+            "calls": self.calls,
+            "errors": self.errors,
+            "avg_latency": self.total_latency / self.calls if self.calls else None,
+            "max_latency": self.max_latency,
+        }
+
+
+class YFinanceProvider(QuoteProvider):
+    # mode="fast" 只讀 fast_info 的現價與前收，漲跌幅自己算；
+    # mode="info" 走完整的 Ticker.info（整包基本面資料，慢很多）
+    name = "yfinance"
+    MODES = ("fast", "info")
+
+    def __init__(self, mode="fast"):
+        # 打錯字（例如 QUOTE_MODE=fsat）啟動時就報錯，不要默默走 fast_info
+        if mode not in self.MODES:
+            raise ValueError(f"未知的 QUOTE_MODE：{mode}（可用 {'、'.join(self.MODES)}）")
+        super().__init__()
+        self.mode = mode
+        self.name = f"yfinance-{mode}"
+
+    def _fetch(self, symbol):
+        import yfinance as yf
+
+        ticker = yf.Ticker(symbol)
+        if self.mode == "info":
+            info = ticker.info
+            price, prev_close = info.get("regularMarketPrice", None), info.get("regularMarketPreviousClose", None)
+            pct = info.get("regularMarketChangePercent", None)
+            return Quote(symbol, price, change_pct(price, prev_close) if pct is None else pct, prev_close)
+        fi = ticker.fast_info
+        price, prev_close = fi.last_price, fi.previous_close
+        return Quote(symbol, price, change_pct(price, prev_close), prev_close)
+
+
+class YahooChartProvider(QuoteProvider):
+    # 直接打 Yahoo chart API 拿現價與前收（yfinance 底層也是它），
+    # 同步版用 urllib，非同步版用共用的 aiohttp session
+    name = "yahoo-chart"
+    native_async = True
+    URL = "https://query1.finance.yahoo.com/v8/finance/chart/{}?range=1d&interval=1d"
+    HEADERS = {"User-Agent": "Mozilla/5.0"}
+
+    def __init__(self, timeout=10):
+        super().__init__()
+        self.timeout = timeout
+        self._session = None
+
+    def _url(self, symbol):
+        return self.URL.format(urllib.parse.quote(symbol))
+
+    def _parse(self, symbol, data):
+        meta = data["chart"]["result"][0]["meta"]
+        price = meta.get("regularMarketPrice")
+        prev_close = meta.get("chartPreviousClose", meta.get("previousClose"))
+        return Quote(symbol, price, change_pct(price, prev_close), prev_close)
+
+    def _fetch(self, symbol):
+        req = urllib.request.Request(self._url(symbol), headers=self.HEADERS)
+        with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+            return self._parse(symbol, json.load(resp))
+
+    async def _afetch(self, symbol):
+        import aiohttp
+
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                headers=self.HEADERS, timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+        async with self._session.get(self._url(symbol)) as resp:
+            resp.raise_for_status()
+            return self._parse(symbol, await resp.json())
+
+    async def aclose(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+class ReplayProvider(QuoteProvider):
+    # 從 JSON 檔回放報價，可注入延遲，離線壓測用
+    # 檔案格式：{"^GSPC": {"price": 5275.7, "change_pct": -2.24}, ...}
+    name = "replay"
+    native_async = True
+
+    def __init__(self, path, latency=(0.0, 0.0)):
+        super().__init__()
+        with open(path, "r", encoding="utf-8") as f:
+            self.quotes = json.load(f)
+        self.latency = latency
+
+    def _fetch(self, symbol):
+        low, high = self.latency
+        if high > 0:
+            time.sleep(random.uniform(low, high))
+        return self._quote(symbol)
+
+    async def _afetch(self, symbol):
+        low, high = self.latency
+        if high > 0:
+            await asyncio.sleep(random.uniform(low, high))
+        return self._quote(symbol)
+
+    def _quote(self, symbol):
+        q = self.quotes.get(symbol)
+        if q is None:
+            raise KeyError(f"回放檔沒有 {symbol}")
+        price, prev_close = q.get("price"), q.get("prev_close")
+        pct = q.get("change_pct")
+        return Quote(symbol, price, change_pct(price, prev_close) if pct is None else pct, prev_close)
+
+
+def parse_latency(text):
+    # "0.2" 固定 0.2 秒，"0.1-0.5" 在區間內隨機
+    low, _, high = text.partition("-")
+    return float(low), float(high or low)
+
+
+def get_provider():
+    # yahoo：直接打 chart API，非同步模式（v28）不用佔執行緒
+    kind = os.environ.get("QUOTE_PROVIDER", "yfinance")
+    if kind == "replay":
+        return ReplayProvider(
+            os.environ.get("QUOTE_REPLAY_FILE", "fixtures/market_quotes.json"),
+            parse_latency(os.environ.get("QUOTE_REPLAY_LATENCY", "0")),
+        )
+    if kind == "yfinance":
+        return YFinanceProvider(os.environ.get("QUOTE_MODE", "fast"))
+    if kind == "yahoo":
+        return YahooChartProvider()
+    raise ValueError(f"未知的 QUOTE_PROVIDER：{kind}")
+
+
+def record(provider, symbols, path):
+    quotes = {}
+    for s in symbols:
+        q = provider.get_quote(s)
+        quotes[s] = {"price": q.price, "change_pct": q.change_pct, "prev_close": q.prev_close}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(quotes, f, ensure_ascii=False, indent=2)
+    return quotes
+
+
+if __name__ == "__main__":
+    # python quote_provider.py record fixtures/market_quotes.json  用 yfinance 錄一份回放檔
+    # python quote_provider.py bench [次數]                         比較目前 QUOTE_PROVIDER / QUOTE_MODE 的延遲
+    from market_indicator_fetcher import INDICATORS
+
+    cmd = sys.argv[1] if len(sys.argv) > 1 else "bench"
+    if cmd == "record":
+        path = sys.argv[2] if len(sys.argv) > 2 else "fixtures/market_quotes.json"
+        print(record(YFinanceProvider(), INDICATORS, path))
+    else:
+        provider = get_provider()
+        for _ in range(int(sys.argv[2]) if len(sys.argv) > 2 else 5):
+            for s in INDICATORS:
+                provider.get_quote(s)
+        print(provider.stats())
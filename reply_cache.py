@@ -0,0 +1,63 @@
+
+import threading
+import time
+from collections import namedtuple
+
+from symbol_index import normalize_symbol
+
+RenderedReplies = namedtuple("RenderedReplies", ["version", "per_symbol", "static", "render_time"])
+
+
+class ReplyCache:
+    # 每個資料版本把所有個股回覆和排行榜一次組好，請求時只查 dict
+    # symbol_templates：{種類: fn(SymbolRecord)}；static_templates：{名稱: fn(SymbolIndex)}
+    # 同時保留最近 KEEP 個版本：熱更新時 on_swap 先組好新版，換版前後還拿著舊 index 的請求照樣查得到舊版，
+    # 不會新舊兩版輪流把整份回覆重組
+    KEEP = 2
+
+    def __init__(self, symbol_templates, static_templates=None):
+        self.symbol_templates = symbol_templates
+        self.static_templates = static_templates or {}
+        self._lock = threading.Lock()
+        self._versions = {}  # 版本 -> RenderedReplies，依組好的先後排列；整個 dict 換掉，讀的時候不用鎖
+        self.builds = 0
+
+    def rendered(self, index):
+        r = self._versions.get(index.version)
+        if r is None:
+            with self._lock:
+                r = self._versions.get(index.version)
+                if r is None:
+                    r = self._render(index)
+                    versions = {**self._versions, index.version: r}
+                    self._versions = dict(list(versions.items())[-self.KEEP:])
+        return r
+
+    def _render(self, index):
+        start = time.perf_counter()
+        per_symbol = {
+            kind: {symbol: render(record) for symbol, record in index.records.items()}
+            for kind, render in self.symbol_templates.items()
+        }
+        static = {name: render(index) for name, render in self.static_templates.items()}
+        self.builds += 1
+        return RenderedReplies(index.version, per_symbol, static, time.perf_counter() - start)
+
+    def symbol_reply(self, index, kind, symbol):
+        return self.rendered(index).per_symbol[kind].get(normalize_symbol(symbol))
+
+    def static_reply(self, index, name):
+        return self.rendered(index).static[name]
+
+    def stats(self):
+        versions = self._versions
+        if not versions:
+            return {"version": None, "builds": self.builds}
+        r = list(versions.values())[-1]
+        return {
+            "version": r.version,
+            "cached_versions": list(versions),
+            "builds": self.builds,
+            "replies": sum(len(v) for v in r.per_symbol.values()) + len(r.static),
+            "render_time": r.render_time,
+        }
@@ -0,0 +1,38 @@
+
+import threading
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    # 同一個 key 同時只跑一次，其他呼叫者等同一個 Future，成功失敗都共用
+    # 實際呼叫在背景執行緒跑，呼叫者可以只等 timeout 秒就先離開
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.stats = {"calls": 0, "shared": 0}
+
+    def do(self, key, fn, timeout=None):
+        return self.submit(key, fn).result(timeout)
+
+    def submit(self, key, fn):
+        with self._lock:
+            fut = self._calls.get(key)
+            if fut is not None:
+                self.stats["shared"] += 1
+                return fut
+            fut = self._calls[key] = Future()
+            self.stats["calls"] += 1
+        threading.Thread(target=self._run, args=(key, fn, fut), daemon=True).start()
+        return fut
+
+    def _run(self, key, fn, fut):
+        try:
+            result = fn()
+        except BaseException as e:
+            with self._lock:
+                self._calls.pop(key, None)
+            fut.set_exception(e)
+            return
+        with self._lock:
+            self._calls.pop(key, None)
+        fut.set_result(result)
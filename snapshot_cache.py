@@ -0,0 +1,64 @@
+
+import threading
+import time
+
+from single_flight import SingleFlight
+
+
+class SnapshotCache:
+    # 過期後先回舊值，同時只在背景跑一個更新
+    # ttl 可以是秒數，或在每次寫入時以資料產生時間（epoch 秒）呼叫、回傳秒數的函式
+    # age(value) 回傳 loader 拿到的資料已經過了幾秒（例如別的行程先抓好的），預設當作剛產生
+    def __init__(self, loader, ttl, age=None):
+        self.loader = loader
+        self.ttl = ttl
+        self.value_age = age
+        self._value = None
+        self._loaded_at = None
+        self._expires_in = None
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+
+    def age(self):
+        if self._loaded_at is None:
+            return None
+        return time.monotonic() - self._loaded_at
+
+    def is_stale(self):
+        with self._lock:
+            loaded_at, expires_in = self._loaded_at, self._expires_in
+        return loaded_at is not None and time.monotonic() - loaded_at >= expires_in
+
+    def peek(self):
+        # 不觸發更新，只看目前的值（沒有就是 None）
+        return self._value
+
+    def get(self, timeout=None):
+        # 冷啟動時最多等 timeout 秒（逾時丟 TimeoutError），之後一律立刻回快取
+        # 值、寫入時間、有效期一起在鎖內讀，不會和 put 交錯拿到新值配舊的有效期
+        with self._lock:
+            value, loaded_at, expires_in = self._value, self._loaded_at, self._expires_in
+        if loaded_at is None:
+            return self.refresh(timeout)
+        if time.monotonic() - loaded_at >= expires_in:
+            self._refresh_in_background()
+        return value
+
+    def refresh(self, timeout=None):
+        # 冷啟動或背景更新同時發生時只打一次上游
+        return self._flight.do("refresh", self._load, timeout)
+
+    def _load(self):
+        value = self.loader()
+        self.put(value, self.value_age(value) if self.value_age is not None else 0.0)
+        return value
+
+    def put(self, value, age=0.0):
+        # age：資料在放進來之前已經過了幾秒（例如從磁碟讀回的舊快照）
+        expires_in = self.ttl(time.time() - age) if callable(self.ttl) else self.ttl
+        with self._lock:
+            self._value, self._loaded_at, self._expires_in = value, time.monotonic() - age, expires_in
+
+    def _refresh_in_background(self):
+        # 失敗時保留舊值，錯誤由 loader 自己記錄
+        self._flight.submit("refresh", self._load)
@@ -0,0 +1,272 @@
+
+import csv
+import hashlib
+import json
+import math
+import mmap
+import os
+import sys
+import time
+from array import array
+from datetime import datetime
+
+from symbol_index import SymbolRecord, normalize_symbol
+
+# 訊號與回測的二進位欄式快照：
+#   MAGIC | uint32 表頭長度 | 表頭 JSON（欄位位置、型別、長度）| 8 byte 對齊的各欄位陣列
+# 字串全部 intern 成 id，勝率等彙總值預先算好，查詢用檔內的開放定址雜湊表。
+# 載入時整個檔案 mmap 唯讀，多個 worker 行程共用同一份 page cache。
+MAGIC = b"LMBSNAP1"
+FORMAT_VERSION = 1
+
+
+def _fnv1a(data):
+    h = 0x811C9DC5
+    for b in data:
+        h = ((h ^ b) * 0x01000193) & 0xFFFFFFFF
+    return h
+
+
+class _Strings:
+    def __init__(self):
+        self.ids = {}
+        self.values = []
+
+    def intern(self, text):
+        i = self.ids.get(text)
+        if i is None:
+            i = self.ids[text] = len(self.values)
+            self.values.append(text)
+        return i
+
+    def columns(self, prefix):
+        offsets, blob = array("I", [0]), bytearray()
+        for text in self.values:
+            blob += text.encode("utf-8")
+            offsets.append(len(blob))
+        return {f"{prefix}_offsets": offsets, f"{prefix}_blob": array("B", blob)}
+
+
+def _timestamp(text):
+    return int(datetime.fromisoformat(text).timestamp())
+
+
+def _sources_version(paths):
+    h = hashlib.sha1()
+    for path in paths:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+    return h.hexdigest()[:12]
+
+
+def build_snapshot(signal_path, backtest_path, out_path):
+    start = time.perf_counter()
+    symbols, strings = _Strings(), _Strings()
+    sig = {k: array(t) for k, t in [("sig_symbol", "I"), ("sig_date", "I"), ("sig_close", "d"), ("sig_signal", "I"), ("sig_reason", "I")]}
+    with open(signal_path, "r", encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            sig["sig_symbol"].append(symbols.intern(normalize_symbol(row["Symbol"])))
+            sig["sig_date"].append(strings.intern(row["Date"]))
+            sig["sig_close"].append(float(row["Close"]))
+            sig["sig_signal"].append(strings.intern(row["Signal"]))
+            sig["sig_reason"].append(strings.intern(row["Reason"]))
+
+    bt = {k: array(t) for k, t in [("bt_symbol", "I"), ("bt_entry_ts", "q"), ("bt_exit_ts", "q"), ("bt_entry_price", "d"), ("bt_exit_price", "d"), ("bt_return", "d")]}
+    trades, wins, total_return = {}, {}, {}
+    with open(backtest_path, "r", encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            sid = symbols.intern(normalize_symbol(row["Symbol"]))
+            ret = float(row["Return"])
+            bt["bt_symbol"].append(sid)
+            bt["bt_entry_ts"].append(_timestamp(row["Entry_Date"]))
+            bt["bt_exit_ts"].append(_timestamp(row["Exit_Date"]))
+            bt["bt_entry_price"].append(float(row["Entry_Price"]))
+            bt["bt_exit_price"].append(float(row["Exit_Price"]))
+            bt["bt_return"].append(ret)
+            trades[sid] = trades.get(sid, 0) + 1
+            wins[sid] = wins.get(sid, 0) + (ret > 0)
+            total_return[sid] = total_return.get(sid, 0.0) + ret
+
+    # 彙總依代碼字母排序（和 groupby 一樣），排行榜順序也先排好
+    agg_ids = sorted(trades, key=lambda i: symbols.values[i])
+    agg = {
+        "agg_symbol": array("I", agg_ids),
+        "agg_trades": array("I", (trades[i] for i in agg_ids)),
+        "agg_wins": array("I", (wins[i] for i in agg_ids)),
+        "agg_win_rate": array("d", (round(wins[i] / trades[i] * 100, 2) for i in agg_ids)),
+        "agg_avg_return": array("d", (total_return[i] / trades[i] for i in agg_ids)),
+    }
+    agg["agg_top"] = array("I", sorted(range(len(agg_ids)), key=lambda r: agg["agg_win_rate"][r], reverse=True))
+
+    n = len(symbols.values)
+    sym_sig_row, sym_agg_row = array("i", [-1]) * n, array("i", [-1]) * n
+    for row, sid in enumerate(sig["sig_symbol"]):
+        if sym_sig_row[sid] < 0:
+            sym_sig_row[sid] = row
+    for row, sid in enumerate(agg_ids):
+        sym_agg_row[sid] = row
+
+    size = 8
+    while size < n * 2:
+        size *= 2
+    slots = array("i", [-1]) * size
+    for sid, text in enumerate(symbols.values):
+        pos = _fnv1a(text.encode("utf-8")) & (size - 1)
+        while slots[pos] >= 0:
+            pos = (pos + 1) & (size - 1)
+        slots[pos] = sid
+
+    columns = {**symbols.columns("sym"), **strings.columns("str"), **sig, **bt, **agg,
+               "sym_sig_row": sym_sig_row, "sym_agg_row": sym_agg_row, "sym_slots": slots}
+    header = {
+        "format": FORMAT_VERSION,
+        "byteorder": sys.byteorder,
+        "version": _sources_version([signal_path, backtest_path]),
+        "created_at": time.time(),
+        "counts": {"symbols": n, "signals": len(sig["sig_symbol"]), "trades": len(bt["bt_symbol"])},
+        "columns": {},
+    }
+    # 欄位位移從資料區開頭算起，所以不受表頭長度影響
+    offset = 0
+    for name, arr in columns.items():
+        header["columns"][name] = [offset, arr.typecode, len(arr)]
+        offset += (len(arr) * arr.itemsize + 7) // 8 * 8
+    header_bytes = json.dumps(header).encode("utf-8")
+    data_start = (len(MAGIC) + 4 + len(header_bytes) + 7) // 8 * 8
+
+    tmp = f"{out_path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(MAGIC + len(header_bytes).to_bytes(4, "little") + header_bytes)
+        f.write(b"\0" * (data_start - f.tell()))
+        for name, arr in columns.items():
+            raw = arr.tobytes()
+            f.write(raw + b"\0" * ((len(raw) + 7) // 8 * 8 - len(raw)))
+    # 換新檔（新的 inode），已經 mmap 舊檔的行程不受影響
+    os.replace(tmp, out_path)
+    return header, time.perf_counter() - start
+
+
+def parse_header(buf, name="快照"):
+    # 從整個檔案的 buffer（mmap 或 bytes）解析，回傳（表頭, 資料區開頭位置）
+    if bytes(buf[:len(MAGIC)]) != MAGIC:
+        raise ValueError(f"{name} 不是訊號快照檔")
+    start = len(MAGIC) + 4
+    length = int.from_bytes(buf[len(MAGIC):start], "little")
+    header = json.loads(bytes(buf[start:start + length]))
+    return header, (start + length + 7) // 8 * 8
+
+
+def read_header(path):
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} 不是訊號快照檔")
+        length = int.from_bytes(f.read(4), "little")
+        return parse_header(MAGIC + length.to_bytes(4, "little") + f.read(length), path)
+
+
+def snapshot_version(path):
+    return read_header(path)[0]["version"]
+
+
+class MappedSymbolIndex:
+    # 和 SymbolIndex 同樣的介面，資料直接從 mmap 讀，不複製成 DataFrame / dict
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        # 表頭從同一份 mapping 讀：中途被熱更新 os.replace 換掉檔案也不會拿到新檔的表頭
+        header, data_start = parse_header(self._mm, path)
+        if header["format"] != FORMAT_VERSION or header["byteorder"] != sys.byteorder:
+            raise ValueError(f"{path} 的格式或位元組順序不符")
+        self.header = header
+        self.version = header["version"]
+        view = memoryview(self._mm)
+        self._cols = {}
+        for name, (offset, typecode, length) in header["columns"].items():
+            size = array(typecode).itemsize
+            start = data_start + offset
+            self._cols[name] = view[start:start + length * size].cast("B").cast(typecode)
+        self._records = None
+        self._symbols = None
+
+    def _string(self, prefix, i):
+        offsets = self._cols[f"{prefix}_offsets"]
+        return bytes(self._cols[f"{prefix}_blob"][offsets[i]:offsets[i + 1]]).decode("utf-8")
+
+    def _symbol_id(self, symbol):
+        raw = normalize_symbol(symbol).encode("utf-8")
+        slots = self._cols["sym_slots"]
+        mask = len(slots) - 1
+        pos = _fnv1a(raw) & mask
+        while slots[pos] >= 0:
+            sid = slots[pos]
+            offsets = self._cols["sym_offsets"]
+            if self._cols["sym_blob"][offsets[sid]:offsets[sid + 1]] == raw:
+                return sid
+            pos = (pos + 1) & mask
+        return None
+
+    def _record(self, sid):
+        row = self._cols["sym_sig_row"][sid]
+        if row < 0:
+            return None
+        agg_row = self._cols["sym_agg_row"][sid]
+        return SymbolRecord(
+            self._string("sym", sid),
+            self._string("str", self._cols["sig_signal"][row]),
+            self._string("str", self._cols["sig_reason"][row]),
+            self._cols["sig_close"][row],
+            self._cols["agg_win_rate"][agg_row] if agg_row >= 0 else float("nan"),
+        )
+
+    def get(self, symbol):
+        sid = self._symbol_id(symbol)
+        return None if sid is None else self._record(sid)
+
+    def __contains__(self, symbol):
+        return self.get(symbol) is not None
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def win_rate(self, symbol):
+        sid = self._symbol_id(symbol)
+        if sid is None or self._cols["sym_agg_row"][sid] < 0:
+            return None
+        return self._cols["agg_win_rate"][self._cols["sym_agg_row"][sid]]
+
+    @property
+    def records(self):
+        # 預先產生回覆時才用到，第一次存取才組出來
+        if self._records is None:
+            self._records = {}
+            for sid in self._cols["sig_symbol"]:
+                if sid not in self._records:
+                    record = self._record(sid)
+                    self._records[record.symbol] = record
+        return self._records
+
+    @property
+    def symbols(self):
+        if self._symbols is None:
+            self._symbols = list(self.records)
+        return self._symbols
+
+    def top(self, n):
+        rates = self._cols["agg_win_rate"]
+        rated = [r for r in self._cols["agg_top"] if not math.isnan(rates[r])][:n]
+        return [(self._string("sym", self._cols["agg_symbol"][r]), rates[r]) for r in rated]
+
+
+def open_snapshot(path):
+    return MappedSymbolIndex(path)
+
+
+if __name__ == "__main__":
+    # python snapshot_format.py [訊號 csv] [回測 csv] [輸出檔]
+    args = sys.argv[1:] + [None] * 3
+    signal_path = args[0] or "output/daily_signals.csv"
+    backtest_path = args[1] or "output/backtest_summary.csv"
+    out_path = args[2] or "output/data_snapshot.bin"
+    header, elapsed = build_snapshot(signal_path, backtest_path, out_path)
+    print(f"✅ {out_path}：{header['counts']}，版本 {header['version']}（{elapsed:.3f}s）")
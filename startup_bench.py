@@ -0,0 +1,112 @@
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from snapshot_format import build_snapshot
+
+# 量冷啟動：每次開新的 python 行程載入 webhook 程式，記錄 import 時間與第一個回覆的時間，
+# 以及 pandas / yfinance 有沒有被載入。
+#   baseline：BASELINE_REV 那一版的 v27.1（開機就 import pandas / yfinance、讀 csv 進 DataFrame），用 git show 取出
+#   csv：目前 v27.1 的預設行為
+#   snapshot：目前 v27.1 加上 DATA_SNAPSHOT_FILE
+APP_FILE = "v27.1_linebot_full_combo.py"
+BASELINE_REV = os.environ.get("BENCH_BASELINE_REV", "aa6d4ed")
+FIRST_MESSAGES = ["查詢 TSLA", "勝率 AAPL", "推薦前三名"]
+
+# 舊版沒有 build_reply，回覆寫在 handle_message 裡：塞一個假事件進去，攔下 reply_message
+CHILD = """
+import importlib.util, json, sys, time, types
+start = time.perf_counter()
+spec = importlib.util.spec_from_file_location("app", sys.argv[1])
+app = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(app)
+imported = time.perf_counter()
+if hasattr(app, "build_reply"):
+    app.build_reply(sys.argv[2])
+else:
+    app.line_bot_api.reply_message = lambda *args, **kwargs: None
+    app.handle_message(types.SimpleNamespace(reply_token="bench", message=types.SimpleNamespace(text=sys.argv[2])))
+replied = time.perf_counter()
+print(json.dumps({
+    "import": imported - start,
+    "first_reply": replied - imported,
+    "pandas": "pandas" in sys.modules,
+    "yfinance": "yfinance" in sys.modules,
+}))
+"""
+
+
+def run_once(env, app_file, message):
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-c", CHILD, app_file, message],
+        env=env, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result["process"] = time.perf_counter() - start
+    return result
+
+
+def baseline_app(tmp):
+    # 舊版讀 csv 用相對路徑，所以一樣在目前目錄跑，只有程式本身換成舊版
+    path = os.path.join(tmp, "baseline_app.py")
+    proc = subprocess.run(["git", "show", f"{BASELINE_REV}:{APP_FILE}"], capture_output=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"取不出 {BASELINE_REV}:{APP_FILE}：{proc.stderr.decode().strip()}")
+    with open(path, "wb") as f:
+        f.write(proc.stdout)
+    return path
+
+
+def bench(mode, runs, snapshot_path, app_file=APP_FILE):
+    env = {
+        **os.environ,
+        "YOUR_CHANNEL_ACCESS_TOKEN": os.environ.get("YOUR_CHANNEL_ACCESS_TOKEN", "bench"),
+        "YOUR_CHANNEL_SECRET": os.environ.get("YOUR_CHANNEL_SECRET", "bench"),
+        "DATA_RELOAD_SECONDS": "0",
+        "MARKET_REFRESH_SECONDS": "0",
+    }
+    env.pop("DATA_SNAPSHOT_FILE", None)
+    if mode == "snapshot":
+        env["DATA_SNAPSHOT_FILE"] = snapshot_path
+    results = [run_once(env, app_file, FIRST_MESSAGES[i % len(FIRST_MESSAGES)]) for i in range(runs)]
+    return {
+        "mode": mode,
+        "runs": runs,
+        "import": statistics.median(r["import"] for r in results),
+        "first_reply": statistics.median(r["first_reply"] for r in results),
+        "process": statistics.median(r["process"] for r in results),
+        "pandas": any(r["pandas"] for r in results),
+        "yfinance": any(r["yfinance"] for r in results),
+    }
+
+
+if __name__ == "__main__":
+    # python startup_bench.py [次數]
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    with tempfile.TemporaryDirectory() as tmp:
+        snapshot_path = os.path.join(tmp, "data_snapshot.bin")
+        # 快照由資料管線事先產生，不算進冷啟動
+        build_snapshot(
+            os.environ.get("SIGNAL_FILE", "daily_signals.csv"),
+            os.environ.get("BACKTEST_FILE", "backtest_summary.csv"),
+            snapshot_path,
+        )
+        for mode in ("baseline", "csv", "snapshot"):
+            try:
+                app_file = baseline_app(tmp) if mode == "baseline" else APP_FILE
+                r = bench(mode, runs, snapshot_path, app_file)
+            except RuntimeError as e:
+                print(f"{mode:>8}：❌ {e}")
+                continue
+            print(
+                f"{r['mode']:>8}：import {r['import'] * 1000:.0f}ms，第一個回覆 {r['first_reply'] * 1000:.1f}ms，"
+                f"整個行程 {r['process'] * 1000:.0f}ms，pandas={r['pandas']} yfinance={r['yfinance']}"
+            )
@@ -0,0 +1,310 @@
+
+import atexit
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS subscribers (
+    user_id TEXT PRIMARY KEY,
+    first_seen REAL NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS watchlists (
+    user_id TEXT PRIMARY KEY,
+    symbols TEXT NOT NULL,
+    updated REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS watchlists_by_symbols ON watchlists (symbols, user_id);
+"""
+
+_LINE_USER_ID = re.compile(r"U[0-9a-f]{32}")
+
+
+class CompactIdSet:
+    # 訂閱者 id 的精簡存法：LINE user id 是 "U" + 32 個小寫十六進位字元，轉成 16 bytes 後
+    # 依序接成一整塊 bytes（每個 id 固定 16 bytes；Python set 存字串一個要一百多 bytes），查詢用二分搜尋。
+    # 建立時要給排好序的 id（read_ids 依主鍵順序讀）；格式不符或之後才加入的 id 放一般 set
+    WIDTH = 16
+
+    def __init__(self, sorted_ids=()):
+        keys, extra, last = bytearray(), set(), b""
+        for uid in sorted_ids:
+            key = self._encode(uid)
+            if key is None or key < last:
+                extra.add(uid)
+            elif key != last:
+                keys += key
+                last = key
+        self._keys = bytes(keys)
+        self._count = len(self._keys) // self.WIDTH
+        self._extra = extra
+
+    @classmethod
+    def _encode(cls, uid):
+        # 只收剛好 "U" + 32 個小寫十六進位字元的 id：bytes.fromhex 會略過空白，不先檢查可能拿到不滿 16 bytes 的 key，
+        # 整塊 bytes 就錯位了
+        if isinstance(uid, str) and _LINE_USER_ID.fullmatch(uid):
+            key = bytes.fromhex(uid[1:])
+            if len(key) == cls.WIDTH:
+                return key
+        return None
+
+    def _find(self, key):
+        keys, width, lo, hi = self._keys, self.WIDTH, 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            cur = keys[mid * width:(mid + 1) * width]
+            if cur < key:
+                lo = mid + 1
+            elif cur > key:
+                hi = mid
+            else:
+                return True
+        return False
+
+    def __contains__(self, uid):
+        if uid in self._extra:
+            return True
+        key = self._encode(uid)
+        return key is not None and self._find(key)
+
+    def add(self, uid):
+        # 新加入回傳 True，已經有了回傳 False
+        if uid in self:
+            return False
+        self._extra.add(uid)
+        return True
+
+    def __len__(self):
+        return self._count + len(self._extra)
+
+    @property
+    def nbytes(self):
+        return len(self._keys)
+
+
+def _connect(path):
+    db = sqlite3.connect(path, timeout=30)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")
+    return db
+
+
+@contextmanager
+def _transaction(path):
+    db = _connect(path)
+    try:
+        with db:
+            yield db
+    finally:
+        db.close()
+
+
+def _insert(path, rows):
+    # 回傳實際新增的筆數
+    with _transaction(path) as db:
+        before = db.total_changes
+        db.executemany("INSERT OR IGNORE INTO subscribers (user_id, first_seen) VALUES (?, ?)", rows)
+        return db.total_changes - before
+
+
+def init_db(path, legacy_file=None):
+    # 建表；資料表還是空的而舊版 subscribers.txt（一行一個 id、可能重複）存在，就一次匯入
+    with _transaction(path) as db:
+        db.executescript(SCHEMA)
+        empty = db.execute("SELECT 1 FROM subscribers LIMIT 1").fetchone() is None
+    if empty and legacy_file and os.path.exists(legacy_file):
+        # 邊讀邊分批寫入，重複的 id 由主鍵（INSERT OR IGNORE）擋掉，不必先把整個檔案讀成 set
+        count = 0
+        for chunk in iter_file_chunks(legacy_file):
+            count += _insert(path, [(uid, time.time()) for uid in chunk])
+        print(f"✅ 已從 {legacy_file} 匯入 {count} 位訂閱者")
+
+
+def iter_file_chunks(path, chunk_size=10000):
+    # 一行一個 id：每 chunk_size 行交出一批（批內已去重）
+    with open(path, "r") as f:
+        chunk = set()
+        for line in f:
+            uid = line.strip()
+            if uid:
+                chunk.add(uid)
+                if len(chunk) >= chunk_size:
+                    yield list(chunk)
+                    chunk = set()
+        if chunk:
+            yield list(chunk)
+
+
+def read_ids(path, chunk_size=10000):
+    # 依主鍵順序分批讀，不會一次把整張表載進來
+    db = _connect(path)
+    try:
+        cur = db.execute("SELECT user_id FROM subscribers ORDER BY user_id")
+        while True:
+            rows = cur.fetchmany(chunk_size)
+            if not rows:
+                return
+            for (uid,) in rows:
+                yield uid
+    finally:
+        db.close()
+
+
+def watchlist_key(symbols):
+    # 關注清單的標準形式：去重、排序後用逗號串起來，內容相同的清單 key 一定相同
+    return ",".join(sorted(set(symbols)))
+
+
+def read_watchlist_groups(path, chunk_size=10000):
+    # 逐筆讀出 (關注清單, user_id)，同一份清單的使用者連在一起；沒設清單的 key 是 ""，排在最後。
+    # 兩段查詢都照索引順序走（watchlists_by_symbols / subscribers 主鍵），SQLite 不用先排序整張表，
+    # 第一筆馬上就能讀到，記憶體只放 chunk_size 筆
+    queries = [
+        "SELECT symbols, user_id FROM watchlists ORDER BY symbols, user_id",
+        "SELECT '', user_id FROM subscribers s "
+        "WHERE NOT EXISTS (SELECT 1 FROM watchlists w WHERE w.user_id = s.user_id) ORDER BY user_id",
+    ]
+    db = _connect(path)
+    try:
+        for sql in queries:
+            cur = db.execute(sql)
+            while True:
+                rows = cur.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield from rows
+    finally:
+        db.close()
+
+
+class SubscriberStore:
+    # 訂閱者名單：記憶體裡一個 set 判斷是否已知，新使用者先放 pending，
+    # 由背景執行緒每 flush_interval 秒（或累積 batch_size 筆）一次寫進 SQLite。
+    # 已知使用者傳訊息完全不碰磁碟；多個 worker 同時寫靠 PRIMARY KEY + INSERT OR IGNORE 去重。
+    def __init__(self, path, flush_interval=5, batch_size=500, legacy_file=None):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending = {}
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+        self.seen = 0
+        self.added = 0
+        self.flushes = 0
+        self.flushed = 0
+        self.last_flush_time = None
+        self.last_error = None
+        init_db(path, legacy_file)
+        start = time.perf_counter()
+        # 啟動時依主鍵順序讀進 CompactIdSet，每個已知 id 佔 16 bytes；之後新加入的放在它的 set 裡
+        self._known = CompactIdSet(read_ids(path))
+        self.load_time = time.perf_counter() - start
+
+    def add(self, user_ids):
+        # 回傳這次新增的 id 數
+        new = 0
+        with self._lock:
+            self.seen += len(user_ids)
+            now = time.time()
+            for uid in user_ids:
+                if self._known.add(uid):
+                    self._pending[uid] = now
+                    new += 1
+            self.added += new
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self._wake.set()
+        if new and self._thread is None:
+            self.flush()
+        return new
+
+    def set_watchlist(self, user_ids, symbols):
+        # 關注清單很少改，直接寫進資料庫（推播程式在另一個行程讀）；symbols 空的就是清除
+        key = watchlist_key(symbols)
+        with _transaction(self.path) as db:
+            if key:
+                now = time.time()
+                # 順便確保在訂閱者名單裡（一般新使用者要等下一次 flush 才寫入）
+                db.executemany(
+                    "INSERT OR IGNORE INTO subscribers (user_id, first_seen) VALUES (?, ?)", [(uid, now) for uid in user_ids]
+                )
+                db.executemany(
+                    "INSERT OR REPLACE INTO watchlists (user_id, symbols, updated) VALUES (?, ?, ?)",
+                    [(uid, key, now) for uid in user_ids],
+                )
+            else:
+                db.executemany("DELETE FROM watchlists WHERE user_id = ?", [(uid,) for uid in user_ids])
+        return key.split(",") if key else []
+
+    def watchlist(self, user_id):
+        with _transaction(self.path) as db:
+            row = db.execute("SELECT symbols FROM watchlists WHERE user_id = ?", (user_id,)).fetchone()
+        return row[0].split(",") if row else []
+
+    def __contains__(self, user_id):
+        return user_id in self._known
+
+    def __len__(self):
+        return len(self._known)
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return 0
+            start = time.perf_counter()
+            try:
+                _insert(self.path, list(pending.items()))
+            except sqlite3.Error as e:
+                # 寫失敗就放回 pending，下一輪再試
+                with self._lock:
+                    pending.update(self._pending)
+                    self._pending = pending
+                self.last_error = str(e)
+                print("❌ 訂閱者寫入失敗：", e)
+                return 0
+            self.flushes += 1
+            self.flushed += len(pending)
+            self.last_flush_time = time.perf_counter() - start
+            self.last_error = None
+            return len(pending)
+
+    def start(self):
+        if self._thread is None and self.flush_interval > 0:
+            self._thread = threading.Thread(target=self._run, name="subscriber-flush", daemon=True)
+            self._thread.start()
+            atexit.register(self.stop)
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        self.flush()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def stats(self):
+        return {
+            "known": len(self._known),
+            "known_bytes": self._known.nbytes,
+            "pending": len(self._pending),
+            "seen": self.seen,
+            "added": self.added,
+            "flushes": self.flushes,
+            "flushed": self.flushed,
+            "load_time": self.load_time,
+            "last_flush_time": self.last_flush_time,
+            "last_error": self.last_error,
+        }
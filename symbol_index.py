@@ -0,0 +1,55 @@
+
+import hashlib
+import math
+import unicodedata
+from collections import namedtuple
+
+SymbolRecord = namedtuple("SymbolRecord", ["symbol", "signal", "reason", "close", "win_rate"])
+
+
+def normalize_symbol(text):
+    # 全形轉半形、去空白、轉大寫：ＴＳＬＡ / tsla / " TSLA " 都對到 TSLA
+    return unicodedata.normalize("NFKC", str(text)).strip().upper()
+
+
+class SymbolIndex:
+    # 資料載入時建一次：代碼 -> 精簡紀錄，查詢只做一次 dict lookup
+    def __init__(self, rows, win_rates):
+        self.win_rates = {normalize_symbol(s): r for s, r in win_rates.items()}
+        self.records = {}
+        for row in rows:
+            symbol = normalize_symbol(row["Symbol"])
+            if symbol in self.records:
+                continue
+            self.records[symbol] = SymbolRecord(
+                symbol,
+                row["Signal"],
+                row["Reason"],
+                float(row["Close"]),
+                self.win_rates.get(symbol, float("nan")),
+            )
+        self.symbols = list(self.records)
+        # 資料版本：內容一樣版本就一樣，預先產生的回覆靠它判斷要不要重建
+        self.version = hashlib.sha1(repr((self.records, self.win_rates)).encode("utf-8")).hexdigest()[:12]
+
+    @classmethod
+    def from_frames(cls, signal_df, win_rate_df, symbol_col="Symbol", rate_col="win_rate"):
+        win_rates = dict(zip(win_rate_df[symbol_col], win_rate_df[rate_col]))
+        return cls(signal_df.to_dict("records"), win_rates)
+
+    def __contains__(self, symbol):
+        return normalize_symbol(symbol) in self.records
+
+    def __len__(self):
+        return len(self.records)
+
+    def get(self, symbol):
+        return self.records.get(normalize_symbol(symbol))
+
+    def win_rate(self, symbol):
+        return self.win_rates.get(normalize_symbol(symbol))
+
+    def top(self, n):
+        # 勝率由高到低，同分維持原本順序
+        rated = [(s, r) for s, r in self.win_rates.items() if not math.isnan(r)]
+        return sorted(rated, key=lambda x: x[1], reverse=True)[:n]
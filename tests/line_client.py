@@ -0,0 +1,37 @@
+import json
+import urllib.error
+import urllib.request
+
+# 不裝 line-bot-sdk 也能驅動 BroadcastEngine：它只用到 api.headers / api.endpoint / api.http_client.post
+
+
+class Response:
+    def __init__(self, status_code, headers, body):
+        self.status_code = status_code
+        self.headers = headers
+        self.json = json.loads(body or b"{}")
+
+
+class UrllibHttpClient:
+    def post(self, url, headers=None, data=None, timeout=None):
+        req = urllib.request.Request(url, data=data.encode("utf-8"), headers=headers or {}, method="POST")
+        try:
+            with urllib.request.urlopen(req, timeout=timeout or 10) as resp:
+                return Response(resp.status, dict(resp.headers), resp.read())
+        except urllib.error.HTTPError as e:
+            return Response(e.code, dict(e.headers), e.read())
+
+
+class Api:
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.headers = {"Authorization": "Bearer test"}
+        self.http_client = UrllibHttpClient()
+
+
+class Text:
+    def __init__(self, text):
+        self.text = text
+
+    def as_json_dict(self):
+        return {"type": "text", "text": self.text}
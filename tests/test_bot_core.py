@@ -0,0 +1,74 @@
+import asyncio
+import importlib
+import os
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+USERS = ["U" + "a" * 32, "U" + "b" * 32]
+
+
+@pytest.fixture
+def bot(monkeypatch, tmp_path):
+    monkeypatch.setenv("QUOTE_PROVIDER", "replay")
+    monkeypatch.setenv("QUOTE_REPLAY_FILE", os.path.join(REPO_DIR, "fixtures", "market_quotes.json"))
+    monkeypatch.setenv("MARKET_SNAPSHOT_FILE", str(tmp_path / "market_snapshot.json"))
+    monkeypatch.setenv("SIGNAL_FILE", os.path.join(REPO_DIR, "daily_signals.csv"))
+    monkeypatch.setenv("BACKTEST_FILE", os.path.join(REPO_DIR, "backtest_summary.csv"))
+    monkeypatch.setenv("DATA_SNAPSHOT_FILE", str(tmp_path / "data_snapshot.bin"))
+    monkeypatch.setenv("DATA_RELOAD_SECONDS", "0")
+    monkeypatch.setenv("SUBSCRIBERS_DB", str(tmp_path / "subscribers.db"))
+    monkeypatch.setenv("SUBSCRIBERS_FILE", str(tmp_path / "subscribers.txt"))
+    monkeypatch.setenv("SUBSCRIBERS_FLUSH_SECONDS", "0")
+    import market_indicator_fetcher
+
+    importlib.reload(market_indicator_fetcher)
+    import bot_core
+
+    return importlib.reload(bot_core)
+
+
+def test_unwatch_with_symbols_removes_only_those(bot):
+    assert bot.build_reply("關注 TSLA CELH", USERS[:1]) == "⭐ 你的關注清單：CELH、TSLA"
+    assert bot.build_reply("關注 tsla", USERS[1:]) == "⭐ 你的關注清單：TSLA"
+    # 每個人各自移除，回覆也各自不同
+    reply = bot.build_reply("取消關注 TSLA", USERS)
+    assert reply[USERS[0]] == "⭐ 你的關注清單：CELH"
+    assert reply[USERS[1]].startswith("你還沒有設定關注清單")
+    assert bot.subscriber_store.watchlist(USERS[0]) == ["CELH"]
+
+
+def test_bare_unwatch_clears_list(bot):
+    bot.build_reply("關注 TSLA", USERS[:1])
+    assert bot.build_reply("取消關注", USERS[:1]).startswith("✅ 已清除關注清單")
+    assert bot.subscriber_store.watchlist(USERS[0]) == []
+
+
+def test_async_watch_runs_off_the_event_loop(bot, monkeypatch):
+    loops = []
+
+    def watchlist(uid, _orig=bot.subscriber_store.watchlist):
+        loops.append(_running_loop())  # 在執行緒裡就沒有 running loop
+        return _orig(uid)
+
+    monkeypatch.setattr(bot.subscriber_store, "watchlist", watchlist)
+    reply = asyncio.run(bot.build_reply_async("關注", USERS[:1]))
+    assert reply[USERS[0]].startswith("你還沒有設定關注清單")
+    assert loops == [None]
+
+
+def _running_loop():
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+def test_market_reply_shows_yield_in_percent(bot):
+    import market_indicator_fetcher
+
+    snap = market_indicator_fetcher.fetch_market_snapshot()
+    # 回放檔的 ^TNX 是 4.28（本來就是百分比）
+    assert "10Y殖利率：4.28%" in bot.format_market_summary(snap)
+    assert market_indicator_fetcher.format_yield(snap.quote("^TNX")) == "4.28%"
+    assert market_indicator_fetcher.format_yield(snap.quote("^MISSING")) == "資料不足"
@@ -0,0 +1,191 @@
+import json
+import os
+import subprocess
+import sys
+import time
+from email.utils import formatdate
+
+import pytest
+
+import line_api_stub
+from broadcast_engine import (
+    MULTICAST_SIZE, BatchResult, BroadcastEngine, Checkpoint, TokenBucket, checkpoint_file, format_result, parse_retry_after,
+)
+from line_client import Api, Text
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(TESTS_DIR)
+
+# 子行程送出第 KILL_AFTER 批回報後直接 os._exit，模擬推播到一半被砍：
+# 這時還有幾批已經送到 stub、卻來不及寫 done
+CHILD = """
+import json, os, sys
+sys.path[:0] = [{repo!r}, {tests!r}]
+from broadcast_engine import BroadcastEngine
+from line_client import Api, Text
+users = json.load(open({users!r}))
+engine = BroadcastEngine(Api({endpoint!r}), {checkpoint!r}, rate=1000, concurrency=4, batch_size=10)
+count = [0]
+def on_result(r):
+    count[0] += 1
+    if count[0] == {kill_after}:
+        os._exit(3)
+engine.run("daily-test", users, [Text("hi")], on_result)
+"""
+
+
+def uid(n):
+    return f"U{n:032x}"
+
+
+@pytest.fixture
+def stub():
+    server = line_api_stub.start(latency=0.02)
+    yield server
+    server.shutdown()
+
+
+def test_resume_after_kill_with_inserted_subscriber_sends_nobody_twice(stub, tmp_path):
+    endpoint = f"http://127.0.0.1:{stub.server_port}"
+    checkpoint = str(tmp_path / "checkpoint.jsonl")
+    users = [uid(n) for n in range(0, 400, 2)]
+    users_file = tmp_path / "users.json"
+    users_file.write_text(json.dumps(users))
+    code = CHILD.format(repo=REPO_DIR, tests=TESTS_DIR, users=str(users_file), endpoint=endpoint,
+                        checkpoint=checkpoint, kill_after=5)
+    proc = subprocess.run([sys.executable, "-c", code], timeout=60)
+    assert proc.returncode == 3
+    time.sleep(0.2)  # 讓被砍之前已送出的請求在 stub 端處理完
+    first = stub.state.stats()
+    assert 0 < first["users"] < len(users)
+
+    # 重跑之前名單變了：最前面和中間各插入一位、最後面一位取消訂閱，之後所有批次的邊界都會移動
+    resumed = sorted(users[:-1] + [uid(1), uid(201), uid(1001)])
+    engine = BroadcastEngine(Api(endpoint), checkpoint, rate=1000, concurrency=4, batch_size=10)
+    summary = engine.run("daily-test", resumed, [Text("hi")])
+
+    deliveries = stub.state.deliveries
+    assert max(deliveries.values()) == 1
+    assert all(deliveries[u] == 1 for u in users[:-1])
+    assert deliveries[uid(1001)] == 1
+    assert summary["failed"] == 0
+    assert summary["resumed_skip"] > 0
+
+    # 第三次跑：全部完成，什麼都不送
+    again = BroadcastEngine(Api(endpoint), checkpoint, rate=1000, concurrency=4, batch_size=10)
+    assert again.run("daily-test", resumed, [Text("hi")])["requests"] == 0
+    assert max(deliveries.values()) == 1
+
+
+def test_retries_server_errors_until_sent(tmp_path):
+    server = line_api_stub.start(error_rate=0.3)
+    try:
+        engine = BroadcastEngine(Api(f"http://127.0.0.1:{server.server_port}"), str(tmp_path / "cp.jsonl"),
+                                 rate=1000, concurrency=2, max_retries=20, base_delay=0.001, batch_size=10)
+        summary = engine.run("b", [uid(n) for n in range(100)], [Text("hi")])
+        assert summary["failed"] == 0
+        assert summary["recipients"] == 100
+        assert max(server.state.deliveries.values()) == 1
+    finally:
+        server.shutdown()
+
+
+def test_rejects_unsorted_user_ids(stub, tmp_path):
+    engine = BroadcastEngine(Api(f"http://127.0.0.1:{stub.server_port}"), str(tmp_path / "cp.jsonl"), batch_size=10)
+    with pytest.raises(ValueError):
+        engine.run("b", [uid(2), uid(1)], [Text("hi")])
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("5") == 5.0
+    assert parse_retry_after("-3") == 0.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("soon") is None
+    assert parse_retry_after("nan") is None
+    assert 25 <= parse_retry_after(formatdate(time.time() + 30, usegmt=True)) <= 30
+    assert parse_retry_after(formatdate(time.time() - 30, usegmt=True)) == 0.0
+
+
+def test_backoff_falls_back_to_exponential_on_bad_retry_after():
+    engine = BroadcastEngine(None, "unused", base_delay=1.0, max_delay=60.0)
+    assert 2.0 <= engine._backoff(2, "Wed, 99 Foo 2026 garbage") <= 4.0
+    assert engine._backoff(0, "120") == 60.0
+
+
+def test_plan_splits_into_batch_size_chunks(tmp_path):
+    engine = BroadcastEngine(None, "unused", batch_size=10)
+    checkpoint = Checkpoint(str(tmp_path / "cp.jsonl"), "b")
+    plan = list(engine._plan("b", "", iter(uid(n) for n in range(25)), checkpoint))
+    assert [len(batch) for _, batch in plan] == [10, 10, 5]
+    assert [(r.first, r.last) for r, _ in plan][1] == (uid(10), uid(19))
+    assert len({r.key for r, _ in plan}) == 3
+
+
+def test_token_bucket_limits_rate():
+    bucket = TokenBucket(rate=100, burst=5)
+    start = time.monotonic()
+    for _ in range(25):
+        bucket.acquire()
+    # 前 5 個是 burst，其餘 20 個要照每秒 100 個補
+    assert time.monotonic() - start >= 0.18
+    assert bucket.waited > 0
+
+
+def test_groups_are_batched_into_multicasts_of_at_most_500(stub, tmp_path):
+    engine = BroadcastEngine(Api(f"http://127.0.0.1:{stub.server_port}"), str(tmp_path / "cp.jsonl"),
+                             rate=1000, concurrency=4)
+    groups = [
+        ("AAPL,TSLA", [uid(n) for n in range(1200)], [Text("a")]),
+        ("", [uid(n) for n in range(2000, 2300)], [Text("b")]),
+    ]
+    printed = []
+    summary = engine.run_groups("b", iter(groups), on_result=printed.append)
+    assert sorted((r.group, r.size) for r in printed) == [("", 300), ("AAPL,TSLA", 200), ("AAPL,TSLA", 500), ("AAPL,TSLA", 500)]
+    assert summary["groups"] == 2
+    assert [r.size for r in summary["results"]] == [MULTICAST_SIZE, MULTICAST_SIZE, 200, 300]
+    assert summary["requests"] == 4
+    assert summary["recipients"] == 1500
+    assert len(stub.state.deliveries) == 1500 and max(stub.state.deliveries.values()) == 1
+
+
+def test_rate_limited_requests_are_retried(tmp_path):
+    server = line_api_stub.start(rate=20)
+    try:
+        engine = BroadcastEngine(Api(f"http://127.0.0.1:{server.server_port}"), str(tmp_path / "cp.jsonl"),
+                                 rate=1000, concurrency=4, max_retries=20, base_delay=0.05, max_delay=0.5, batch_size=10)
+        summary = engine.run("b", [uid(n) for n in range(300)], [Text("hi")])
+        assert summary["failed"] == 0
+        assert summary["status_counts"].get("429", 0) > 0
+        assert len(server.state.deliveries) == 300 and max(server.state.deliveries.values()) == 1
+    finally:
+        server.shutdown()
+
+
+def test_checkpoint_is_per_broadcast_and_compacted_when_done(stub, tmp_path):
+    path = str(tmp_path / "checkpoint.jsonl")
+    engine = BroadcastEngine(Api(f"http://127.0.0.1:{stub.server_port}"), path, rate=1000, batch_size=10)
+    users = [uid(n) for n in range(100)]
+    engine.run("daily-2026-10-18", users, [Text("hi")])
+    engine.run("daily-2026-10-19", users, [Text("hi")])
+    assert sorted(os.listdir(tmp_path)) == ["checkpoint.daily-2026-10-18.jsonl", "checkpoint.daily-2026-10-19.jsonl"]
+
+    # 完成後名單不留在檔案裡，只剩一行摘要
+    lines = open(checkpoint_file(path, "daily-2026-10-18")).read().splitlines()
+    assert len(lines) == 1 and "ids" not in json.loads(lines[0])
+
+    # 重跑同一天：什麼都不送，之後才加入的人照樣補送
+    again = BroadcastEngine(Api(f"http://127.0.0.1:{stub.server_port}"), path, rate=1000, batch_size=10)
+    summary = again.run("daily-2026-10-18", users + [uid(1000)], [Text("hi")])
+    assert summary["requests"] == 1
+    assert summary["resumed_skip"] == 10 and summary["recipients_skipped"] == 100
+    assert stub.state.deliveries[uid(1000)] == 1 and stub.state.deliveries[uid(5)] == 2
+
+
+def test_checkpoint_file_name_is_sanitized():
+    assert checkpoint_file("out/cp.jsonl", "a/b c") == "out/cp.a_b_c.jsonl"
+
+
+def test_format_result():
+    assert format_result(BatchResult(0, "k", 500, "sent", 1, 0.12, None, "AAPL")) == "✅ 第 1 批〔AAPL〕：500 人，已送出，1 次（0.12s）"
+    line = format_result(BatchResult(2, "k", 10, "failed", 6, 3.5, "HTTP 500"))
+    assert line == "❌ 第 3 批：10 人，重試 6 次仍失敗（3.50s）：HTTP 500"
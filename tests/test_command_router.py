@@ -0,0 +1,62 @@
+import asyncio
+
+from command_router import CommandRouter
+
+
+def make_router():
+    router = CommandRouter(fallback=lambda cmd: f"help:{cmd.raw}")
+    router.register("market", lambda cmd: "market", exact=["市場", "MARKET"], keywords=["市場"],
+                    async_handler=lambda cmd: _async("market-async"))
+    router.register("stock", lambda cmd: f"stock:{cmd.arg}", prefixes=["查詢"])
+    router.register("watch", lambda cmd: f"watch:{cmd.arg}", prefixes=["關注"])
+    router.register("unwatch", lambda cmd: f"unwatch:{cmd.arg}", prefixes=["取消關注"])
+    router.register("top3", lambda cmd: "top3", keywords=["前三", "前3"])
+    return router
+
+
+async def _async(value):
+    return value
+
+
+def test_exact_beats_prefix_and_keyword():
+    router = make_router()
+    assert router.dispatch(" 市場 ") == "market"
+    assert router.dispatch("market") == "market"
+    # 不是全文相同時，前綴優先於關鍵字
+    assert router.dispatch("查詢市場前三") == "stock:市場前三"
+
+
+def test_longest_prefix_wins():
+    router = make_router()
+    assert router.dispatch("關注 aapl") == "watch:AAPL"
+    assert router.dispatch("取消關注 aapl") == "unwatch:AAPL"
+
+
+def test_earliest_keyword_and_fallback():
+    router = make_router()
+    assert router.dispatch("今天前三名和市場") == "top3"
+    assert router.dispatch("看一下市場前3") == "market"
+    assert router.dispatch("ＴＥＳＴ") == "help:ＴＥＳＴ"
+
+
+def test_normalizes_full_width_input():
+    router = make_router()
+    assert router.dispatch("查詢 ｔｓｌａ") == "stock:TSLA"
+
+
+def test_async_dispatch_uses_async_handler_and_falls_back_to_sync():
+    router = make_router()
+    assert asyncio.run(router.dispatch_async("市場")) == "market-async"
+    assert asyncio.run(router.dispatch_async("查詢 aapl")) == "stock:AAPL"
+
+
+def test_user_ids_and_stats():
+    router = make_router()
+    seen = []
+    router.register("who", lambda cmd: seen.append(cmd.user_ids), exact=["WHO"])
+    router.dispatch("who", ["U1", "U2"])
+    assert seen == [("U1", "U2")]
+    router.dispatch("nothing")
+    stats = router.stats()
+    assert stats["who"]["calls"] == 1
+    assert stats["fallback"]["calls"] == 1
@@ -0,0 +1,47 @@
+import os
+
+from data_snapshot import DataSnapshotManager
+
+
+def _touch(path, text):
+    path.write_text(text)
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+
+
+def test_failing_on_swap_keeps_previous_data(tmp_path):
+    data = tmp_path / "signals.csv"
+    data.write_text("v1")
+    fail = [False]
+
+    def on_swap(snap):
+        if fail[0]:
+            raise RuntimeError("render failed")
+
+    manager = DataSnapshotManager([str(data)], lambda: data.read_text(), interval=0, on_swap=on_swap)
+    old = manager.current
+
+    fail[0] = True
+    _touch(data, "v2")
+    assert manager.check() is False
+    assert manager.current is old
+    assert manager.failures == 1
+    assert manager.last_error == "render failed"
+
+    # 下一輪 on_swap 正常了，這次的版本才換上去
+    fail[0] = False
+    assert manager.check() is True
+    assert manager.current.data == "v2"
+    assert manager.reloads == 1
+    assert manager.last_error is None
+
+
+def test_same_content_does_not_swap(tmp_path):
+    data = tmp_path / "signals.csv"
+    data.write_text("v1")
+    swaps = []
+    manager = DataSnapshotManager([str(data)], lambda: data.read_text(), interval=0, on_swap=swaps.append)
+    _touch(data, "v1")
+    assert manager.check() is False
+    assert swaps == []
+    assert manager.check() is False
@@ -0,0 +1,133 @@
+import asyncio
+import importlib
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+
+@pytest.fixture
+def fetcher(monkeypatch, tmp_path):
+    monkeypatch.setenv("QUOTE_PROVIDER", "replay")
+    monkeypatch.setenv("MARKET_SNAPSHOT_FILE", str(tmp_path / "market_snapshot.json"))
+    import market_indicator_fetcher
+
+    return importlib.reload(market_indicator_fetcher)
+
+
+def test_partial_fetch_keeps_last_good_snapshot(fetcher, monkeypatch):
+    good = fetcher.market_cache.refresh(5)
+    assert len(good.quotes) == 5
+    on_disk = json.load(open(fetcher.SNAPSHOT_FILE))
+
+    # 磁碟上的快照過期了，五檔只剩兩檔抓得到：算上游異常，不能蓋掉快取和磁碟上的上一份
+    monkeypatch.setattr(fetcher, "_shared_snapshot", lambda: None)
+    for symbol in ["^VIX", "DX-Y.NYB", "^TNX"]:
+        del fetcher.provider.quotes[symbol]
+    with pytest.raises(RuntimeError):
+        fetcher.market_cache.refresh(5)
+    assert fetcher.market_cache.peek() is good
+    assert json.load(open(fetcher.SNAPSHOT_FILE)) == on_disk
+    assert fetcher.breaker.stats()["failures"] == 1
+
+    # 過期後照樣回上一份完整資料，並標示延遲
+    fetcher.market_cache.put(good, age=10 ** 7)
+    snap = fetcher.get_market_snapshot(5)
+    assert snap.delayed
+    assert snap.quote("^TNX").price == good.quote("^TNX").price
+
+
+def test_minor_failures_still_update(fetcher):
+    del fetcher.provider.quotes["^TNX"]
+    snap = fetcher.market_cache.refresh(5)
+    assert set(snap.errors) == {"^TNX"}
+    assert json.load(open(fetcher.SNAPSHOT_FILE))["errors"].keys() == {"^TNX"}
+
+
+def test_stuck_quote_is_not_resubmitted(fetcher, monkeypatch):
+    release = threading.Event()
+    calls = []
+    real = fetcher.provider.get_quote
+
+    def get_quote(symbol):
+        calls.append(symbol)
+        if symbol == "^VIX":
+            release.wait(5)  # 上游卡住，逾時之後執行緒還是占著
+        return real(symbol)
+
+    monkeypatch.setattr(fetcher.provider, "get_quote", get_quote)
+    try:
+        first = fetcher.fetch_market_snapshot(timeout=1, quote_timeout=0.1)
+        assert "^VIX" in first.errors and len(first.quotes) == 4
+        second = fetcher.fetch_market_snapshot(timeout=1, quote_timeout=0.1)
+        assert second.errors == {"^VIX": "上一次查詢還沒結束"}
+        assert calls.count("^VIX") == 1
+    finally:
+        release.set()
+    fetcher._in_flight["^VIX"].result(5)
+    assert "^VIX" in fetcher.fetch_market_snapshot(timeout=1, quote_timeout=1).quotes
+
+
+def test_async_fetch_keeps_sync_provider_off_the_default_executor(fetcher, monkeypatch):
+    release = threading.Event()
+    calls = []
+    real = fetcher.provider.get_quote
+
+    def get_quote(symbol):
+        calls.append(symbol)
+        release.wait(5)
+        return real(symbol)
+
+    # 模擬 yfinance：沒有原生 async，上游整個卡住
+    monkeypatch.setattr(fetcher.provider, "native_async", False)
+    monkeypatch.setattr(fetcher.provider, "get_quote", get_quote)
+
+    async def scenario():
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=1))
+        first = await fetcher.fetch_market_snapshot_async(timeout=1, quote_timeout=0.1)
+        second = await fetcher.fetch_market_snapshot_async(timeout=1, quote_timeout=0.1)
+        start = time.monotonic()
+        await asyncio.to_thread(lambda: None)  # 訂閱者寫入用的預設執行緒池不受影響
+        return first, second, time.monotonic() - start
+
+    try:
+        first, second, waited = asyncio.run(scenario())
+    finally:
+        release.set()
+    assert len(first.errors) == 5
+    assert set(second.errors.values()) == {fetcher._BUSY}
+    assert len(calls) == 5
+    assert waited < 0.5
+
+
+def _reload_with_snapshot(monkeypatch, tmp_path, snapshot):
+    path = tmp_path / "market_snapshot.json"
+    path.write_text(json.dumps(snapshot))
+    monkeypatch.setenv("QUOTE_PROVIDER", "replay")
+    monkeypatch.setenv("MARKET_SNAPSHOT_FILE", str(path))
+    import market_indicator_fetcher
+
+    return importlib.reload(market_indicator_fetcher)
+
+
+OLD_SNAPSHOT = {"fetched_at": time.time() - 3 * 86400, "elapsed": 0.1, "errors": {},
+                "quotes": {"^GSPC": [5000.0, -1.0, 5050.0]}}
+
+
+def test_fresh_snapshot_refreshes_instead_of_returning_the_warm_value(monkeypatch, tmp_path):
+    fetcher = _reload_with_snapshot(monkeypatch, tmp_path, OLD_SNAPSHOT)
+    assert fetcher.market_cache.peek().fetched_at == OLD_SNAPSHOT["fetched_at"]
+    snap = fetcher.get_fresh_market_snapshot(timeout=5)
+    assert len(snap.quotes) == 5 and not snap.errors
+    assert not snap.delayed
+    assert snap.fetched_at > OLD_SNAPSHOT["fetched_at"]
+
+
+def test_fresh_snapshot_falls_back_to_disk_when_upstream_fails(monkeypatch, tmp_path):
+    fetcher = _reload_with_snapshot(monkeypatch, tmp_path, OLD_SNAPSHOT)
+    fetcher.provider.quotes.clear()
+    snap = fetcher.get_fresh_market_snapshot(timeout=5)
+    assert snap.delayed
+    assert list(snap.quotes) == ["^GSPC"]
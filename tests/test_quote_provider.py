@@ -0,0 +1,30 @@
+import os
+
+import pytest
+
+from quote_provider import ReplayProvider, get_provider, parse_latency
+
+
+def test_unknown_quote_mode_is_rejected(monkeypatch):
+    monkeypatch.setenv("QUOTE_PROVIDER", "yfinance")
+    monkeypatch.setenv("QUOTE_MODE", "fsat")
+    with pytest.raises(ValueError):
+        get_provider()
+    monkeypatch.setenv("QUOTE_MODE", "info")
+    assert get_provider().name == "yfinance-info"
+
+
+def test_unknown_provider_is_rejected(monkeypatch):
+    monkeypatch.setenv("QUOTE_PROVIDER", "bloomberg")
+    with pytest.raises(ValueError):
+        get_provider()
+
+
+def test_replay_provider(monkeypatch):
+    monkeypatch.setenv("QUOTE_PROVIDER", "replay")
+    monkeypatch.setenv("QUOTE_REPLAY_FILE", os.path.join(os.path.dirname(__file__), "..", "fixtures", "market_quotes.json"))
+    provider = get_provider()
+    assert isinstance(provider, ReplayProvider)
+    assert provider.get_quote("^GSPC").price is not None
+    assert parse_latency("0.1-0.5") == (0.1, 0.5)
+    assert parse_latency("0.2") == (0.2, 0.2)
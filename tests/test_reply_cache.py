@@ -0,0 +1,37 @@
+from collections import namedtuple
+
+from reply_cache import ReplyCache
+
+Record = namedtuple("Record", ["symbol", "signal"])
+
+
+class Index:
+    def __init__(self, version, signal):
+        self.version = version
+        self.records = {s: Record(s, signal) for s in ["AAPL", "TSLA"]}
+
+
+def make_cache():
+    return ReplyCache({"stock": lambda r: f"{r.symbol} {r.signal}"}, {"top": lambda index: index.version})
+
+
+def test_old_and_new_versions_are_both_served_during_a_swap():
+    cache = make_cache()
+    old, new = Index("v1", "Buy"), Index("v2", "Sell")
+    cache.rendered(old)
+    cache.rendered(new)  # on_swap 在換版前先組好新版
+    # 換版前後請求交錯拿到新舊 index，都不用重組
+    for _ in range(3):
+        assert cache.symbol_reply(old, "stock", "aapl") == "AAPL Buy"
+        assert cache.symbol_reply(new, "stock", "aapl") == "AAPL Sell"
+    assert cache.builds == 2
+    assert cache.stats()["version"] == "v2"
+
+
+def test_keeps_only_the_latest_versions():
+    cache = make_cache()
+    for v in ["v1", "v2", "v3"]:
+        cache.rendered(Index(v, "Buy"))
+    assert cache.stats()["cached_versions"] == ["v2", "v3"]
+    assert cache.static_reply(Index("v3", "Buy"), "top") == "v3"
+    assert cache.builds == 3
@@ -0,0 +1,57 @@
+import threading
+
+import pytest
+
+from single_flight import SingleFlight
+
+
+def test_concurrent_callers_share_one_call():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def load():
+        calls.append(1)
+        release.wait(5)
+        return "value"
+
+    futures = [flight.submit("k", load) for _ in range(10)]
+    release.set()
+    assert [f.result(5) for f in futures] == ["value"] * 10
+    assert len(calls) == 1
+    assert flight.stats == {"calls": 1, "shared": 9}
+
+
+def test_errors_are_shared_and_not_cached():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def fail():
+        release.wait(5)
+        raise RuntimeError("upstream down")
+
+    futures = [flight.submit("k", fail) for _ in range(3)]
+    release.set()
+    for f in futures:
+        with pytest.raises(RuntimeError):
+            f.result(5)
+    # 失敗之後下一次呼叫會重新執行
+    assert flight.do("k", lambda: "ok", 5) == "ok"
+    assert flight.stats["calls"] == 2
+
+
+def test_caller_can_stop_waiting_without_cancelling_the_call():
+    flight = SingleFlight()
+    release = threading.Event()
+    with pytest.raises(TimeoutError):
+        flight.do("k", lambda: release.wait(5) and "late", timeout=0.05)
+    fut = flight.submit("k", lambda: "other")  # 還在跑，拿到的是同一個
+    release.set()
+    assert fut.result(5) == "late"
+
+
+def test_different_keys_run_separately():
+    flight = SingleFlight()
+    assert flight.do("a", lambda: 1) == 1
+    assert flight.do("b", lambda: 2) == 2
+    assert flight.stats["shared"] == 0
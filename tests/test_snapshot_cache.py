@@ -0,0 +1,44 @@
+import threading
+import time
+
+import pytest
+
+from snapshot_cache import SnapshotCache
+
+
+def test_stale_value_is_returned_while_refreshing_in_background():
+    values = iter(["v1", "v2"])
+    release = threading.Event()
+
+    def loader():
+        value = next(values)
+        if value == "v2":
+            release.wait(5)
+        return value
+
+    cache = SnapshotCache(loader, ttl=0.05)
+    assert cache.get() == "v1"
+    time.sleep(0.06)
+    assert cache.is_stale()
+    assert cache.get() == "v1"  # 不等背景更新
+    release.set()
+    deadline = time.monotonic() + 5
+    while cache.peek() != "v2" and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert cache.get() == "v2"
+    assert not cache.is_stale()
+
+
+def test_cold_start_times_out():
+    cache = SnapshotCache(lambda: time.sleep(0.5) or "v", ttl=60)
+    with pytest.raises(TimeoutError):
+        cache.get(timeout=0.05)
+
+
+def test_put_with_age_uses_ttl_of_data_time():
+    cache = SnapshotCache(lambda: "fresh", ttl=lambda loaded_at: 30)
+    cache.put("old", age=60)
+    assert cache.is_stale()
+    cache.put("new", age=0)
+    assert not cache.is_stale()
+    assert cache.get() == "new"
@@ -0,0 +1,76 @@
+import csv
+import math
+
+from snapshot_format import build_snapshot, open_snapshot, parse_header, read_header, snapshot_version
+from symbol_index import SymbolIndex
+
+SIGNALS = [
+    ("TSLA", "2025-04-16", "241.55", "Hold", "無訊號"),
+    ("celh", "2025-04-16", "36.66", "Sell", "SMA 死叉"),
+    ("NVDA", "2025-04-16", "101.49", "Buy", "突破"),
+    ("TSLA", "2025-04-15", "250.00", "Buy", "舊的一筆"),
+]
+TRADES = [
+    ("CELH", 0.25), ("CELH", -0.1), ("CELH", 0.06),
+    ("TSLA", 0.1), ("TSLA", -0.2),
+    ("AAPL", 0.3),
+]
+
+
+def write_csvs(tmp_path, signals=SIGNALS, trades=TRADES):
+    signal_path, backtest_path = tmp_path / "signals.csv", tmp_path / "backtest.csv"
+    with open(signal_path, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["Symbol", "Date", "Close", "Signal", "Reason"])
+        w.writerows(signals)
+    with open(backtest_path, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["Symbol", "Entry_Date", "Exit_Date", "Entry_Price", "Exit_Price", "Return", "Return(%)"])
+        for symbol, ret in trades:
+            w.writerow([symbol, "2025-02-19 00:00:00-05:00", "2025-02-21 00:00:00-05:00", 10, 10 * (1 + ret), ret, ret * 100])
+    return str(signal_path), str(backtest_path)
+
+
+def test_round_trip_matches_symbol_index(tmp_path):
+    signal_path, backtest_path = write_csvs(tmp_path)
+    out = str(tmp_path / "snap.bin")
+    header, _ = build_snapshot(signal_path, backtest_path, out)
+    index = open_snapshot(out)
+
+    with open(signal_path, encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    expected = SymbolIndex(rows, {"CELH": 66.67, "TSLA": 50.0, "AAPL": 100.0})
+
+    assert index.symbols == expected.symbols == ["TSLA", "CELH", "NVDA"]
+    for symbol in expected.symbols:
+        got, want = index.get(symbol), expected.get(symbol)
+        assert got[:4] == want[:4]
+        assert (math.isnan(got.win_rate) and math.isnan(want.win_rate)) or got.win_rate == want.win_rate
+    assert index.get("ｔｓｌａ").signal == "Hold"  # 第一筆為準、全形小寫也對得到
+    assert index.get("MSFT") is None and "MSFT" not in index
+    assert index.win_rate("AAPL") == 100.0 and "AAPL" not in index  # 有回測、沒有訊號
+    assert index.top(2) == expected.top(2) == [("AAPL", 100.0), ("CELH", 66.67)]
+    assert index.version == header["version"] == snapshot_version(out)
+    assert header["counts"] == {"symbols": 4, "signals": 4, "trades": 6}
+
+
+def test_header_from_buffer_matches_file(tmp_path):
+    out = str(tmp_path / "snap.bin")
+    build_snapshot(*write_csvs(tmp_path), out)
+    with open(out, "rb") as f:
+        data = f.read()
+    assert parse_header(data) == read_header(out)
+    assert read_header(out)[1] % 8 == 0
+
+
+def test_open_index_survives_replace(tmp_path):
+    # 熱更新是 os.replace 換新檔：已經 mmap 的舊 index 繼續讀舊資料
+    out = str(tmp_path / "snap.bin")
+    build_snapshot(*write_csvs(tmp_path), out)
+    old = open_snapshot(out)
+    (tmp_path / "v2").mkdir()
+    build_snapshot(*write_csvs(tmp_path / "v2", signals=[("AMD", "2025-04-17", "90", "Buy", "新資料")], trades=[("AMD", 0.1)]), out)
+    new = open_snapshot(out)
+    assert old.get("TSLA").close == 241.55 and old.get("AMD") is None
+    assert new.symbols == ["AMD"]
+    assert old.version != new.version
@@ -0,0 +1,26 @@
+from subscriber_store import CompactIdSet
+
+
+def uid(n):
+    return f"U{n:032x}"
+
+
+def test_membership_and_add():
+    ids = CompactIdSet([uid(n) for n in range(0, 100, 2)])
+    assert len(ids) == 50
+    assert uid(10) in ids and uid(11) not in ids
+    assert ids.add(uid(11)) is True
+    assert ids.add(uid(11)) is False
+    assert uid(11) in ids
+    assert ids.nbytes >= 50 * CompactIdSet.WIDTH
+
+
+def test_malformed_ids_stay_out_of_the_packed_keys():
+    # fromhex 會略過空白，這些 id 轉出來不滿 16 bytes，不能混進整塊 bytes 裡
+    odd = ["U" + "a" * 30 + "  ", "U" + "a" * 30 + " a", "U" + " " * 32, "U" + "A" * 32, "x" + "a" * 32, "U" + "a" * 33, "Ua"]
+    ids = CompactIdSet(sorted([uid(1), uid(2), uid(3)] + odd))
+    assert len(ids._keys) == 3 * CompactIdSet.WIDTH
+    for u in odd + [uid(1), uid(2), uid(3)]:
+        assert u in ids
+    assert uid(4) not in ids
+    assert len(ids) == 3 + len(odd)
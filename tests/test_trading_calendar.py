@@ -0,0 +1,55 @@
+from datetime import date, datetime
+
+import trading_calendar as tc
+
+
+def ny(*args):
+    return datetime(*args, tzinfo=tc.NEW_YORK)
+
+
+def test_holidays_2025():
+    assert tc.holidays(2025) == {
+        date(2025, 1, 1), date(2025, 1, 20), date(2025, 2, 17), date(2025, 4, 18), date(2025, 5, 26),
+        date(2025, 6, 19), date(2025, 7, 4), date(2025, 9, 1), date(2025, 11, 27), date(2025, 12, 25),
+    }
+
+
+def test_observed_holidays():
+    # 2022 元旦是週六：不補假；六月節週日補週一
+    assert date(2021, 12, 31) not in tc.holidays(2021) and tc.is_trading_day(date(2021, 12, 31))
+    assert date(2022, 6, 20) in tc.holidays(2022)
+    # 2026 獨立紀念日週六：提前到週五，那天就不是提早收盤
+    assert date(2026, 7, 3) in tc.holidays(2026)
+    assert date(2026, 7, 3) not in tc.early_closes(2026)
+    assert date(2026, 4, 3) in tc.holidays(2026)  # 耶穌受難日
+
+
+def test_early_closes():
+    assert tc.early_closes(2025) == {date(2025, 7, 3), date(2025, 11, 28), date(2025, 12, 24)}
+    assert tc.session(date(2025, 11, 28))[1] == ny(2025, 11, 28, 13, 0)
+    assert tc.session(date(2025, 11, 27)) is None
+    assert not tc.is_market_open(ny(2025, 11, 28, 13, 30))
+    assert tc.is_market_open(ny(2025, 11, 28, 12, 59))
+
+
+def test_ttl_around_the_close():
+    assert tc.snapshot_ttl(60, ny(2025, 4, 15, 15, 59, 30)) == 60
+    # 收盤後到結算（15 分鐘）之間只快取到結算時間
+    assert tc.snapshot_ttl(60, ny(2025, 4, 15, 16, 5)) == 600
+    assert tc.snapshot_ttl(60, ny(2025, 4, 15, 16, 14, 30)) == 60
+    # 結算之後沿用到隔天開盤
+    assert tc.snapshot_ttl(60, ny(2025, 4, 15, 20, 0)) == 13.5 * 3600
+    # 提早收盤的日子從 13:00 起算
+    assert tc.snapshot_ttl(60, ny(2025, 11, 28, 13, 5)) == 600
+
+
+def test_ttl_spans_long_weekend():
+    # 週四收盤後，週五耶穌受難日休市，下一次開盤是週一
+    assert tc.next_open(ny(2025, 4, 17, 20, 0)) == ny(2025, 4, 21, 9, 30)
+    assert tc.snapshot_ttl(60, ny(2025, 4, 17, 20, 0)) == 3 * 86400 + 13.5 * 3600
+    assert tc.last_close(ny(2025, 4, 19, 12, 0)) == ny(2025, 4, 17, 16, 0)
+
+
+def test_timestamps_in_other_zones_are_converted():
+    taipei = datetime(2025, 4, 15, 22, 0, tzinfo=tc.ZoneInfo("Asia/Taipei"))  # 紐約 10:00
+    assert tc.is_market_open(taipei)
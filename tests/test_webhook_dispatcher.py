@@ -0,0 +1,34 @@
+import threading
+import time
+
+from webhook_dispatcher import WebhookDispatcher
+
+
+def test_queued_events_are_processed_before_shutdown():
+    seen = []
+    dispatcher = WebhookDispatcher(seen.append, workers=2, max_queue=10)
+    dispatcher.submit(range(5))
+    dispatcher.shutdown(timeout=5)
+    assert sorted(seen) == [0, 1, 2, 3, 4]
+
+
+def test_shutdown_with_full_queue_returns_within_timeout():
+    block = threading.Event()
+    dispatcher = WebhookDispatcher(lambda e: block.wait(5), workers=1, max_queue=2)
+    dispatcher.submit([1])
+    time.sleep(0.05)
+    dispatcher.submit([2, 3])  # 一個在 worker 手上、兩個塞滿佇列
+    start = time.monotonic()
+    dispatcher.shutdown(timeout=0.2)
+    assert time.monotonic() - start < 1
+    block.set()
+
+
+def test_events_after_shutdown_are_handled_inline():
+    seen = []
+    dispatcher = WebhookDispatcher(seen.append, workers=1, max_queue=10)
+    dispatcher.shutdown(timeout=5)
+    dispatcher.submit(["late"])
+    assert seen == ["late"]
+    assert dispatcher.stats()["inline"] == 1
+    assert dispatcher.stats()["accepted"] == 0
@@ -0,0 +1,128 @@
+
+from datetime import date, datetime, time as dtime, timedelta
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+
+# 美股（NYSE / NASDAQ）交易時段，時間都以紐約時間計
+NEW_YORK = ZoneInfo("America/New_York")
+OPEN_TIME = dtime(9, 30)
+CLOSE_TIME = dtime(16, 0)
+EARLY_CLOSE_TIME = dtime(13, 0)
+
+# 收盤後再等一段時間抓一次，拿到結算後的收盤價
+SETTLE_SECONDS = 15 * 60
+
+
+def _nth_weekday(year, month, weekday, n):
+    d = date(year, month, 1)
+    d += timedelta(days=(weekday - d.weekday()) % 7)
+    return d + timedelta(weeks=n - 1)
+
+
+def _last_weekday(year, month, weekday):
+    d = date(year, month + 1, 1) - timedelta(days=1)
+    return d - timedelta(days=(d.weekday() - weekday) % 7)
+
+
+def _easter(year):
+    a, b, c = year % 19, year // 100, year % 100
+    d, e = b // 4, b % 4
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = c // 4, c % 4
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month = (h + l - 7 * m + 114) // 31
+    day = (h + l - 7 * m + 114) % 31 + 1
+    return date(year, month, day)
+
+
+def _observed(d):
+    # 週六的假日提前到週五，週日的延到週一
+    if d.weekday() == 5:
+        return d - timedelta(days=1)
+    if d.weekday() == 6:
+        return d + timedelta(days=1)
+    return d
+
+
+@lru_cache(maxsize=None)
+def holidays(year):
+    days = {
+        _nth_weekday(year, 1, 0, 3),   # 馬丁路德金恩紀念日
+        _nth_weekday(year, 2, 0, 3),   # 總統日
+        _easter(year) - timedelta(days=2),  # 耶穌受難日
+        _last_weekday(year, 5, 0),     # 陣亡將士紀念日
+        _observed(date(year, 7, 4)),   # 獨立紀念日
+        _nth_weekday(year, 9, 0, 1),   # 勞動節
+        _nth_weekday(year, 11, 3, 4),  # 感恩節
+        _observed(date(year, 12, 25)), # 聖誕節
+    }
+    # 元旦遇週六不補假（不會提前到前一年 12/31）
+    new_year = date(year, 1, 1)
+    if new_year.weekday() != 5:
+        days.add(_observed(new_year))
+    if year >= 2022:
+        days.add(_observed(date(year, 6, 19)))  # 六月節
+    return frozenset(days)
+
+
+@lru_cache(maxsize=None)
+def early_closes(year):
+    days = {_nth_weekday(year, 11, 3, 4) + timedelta(days=1)}  # 感恩節隔天
+    for d in (date(year, 7, 3), date(year, 12, 24)):
+        days.add(d)
+    return frozenset(d for d in days if d.weekday() < 5 and d not in holidays(year))
+
+
+def is_trading_day(d):
+    return d.weekday() < 5 and d not in holidays(d.year)
+
+
+def session(d):
+    if not is_trading_day(d):
+        return None
+    close = EARLY_CLOSE_TIME if d in early_closes(d.year) else CLOSE_TIME
+    return (datetime.combine(d, OPEN_TIME, NEW_YORK), datetime.combine(d, close, NEW_YORK))
+
+
+def _now(now):
+    return (now or datetime.now(NEW_YORK)).astimezone(NEW_YORK)
+
+
+def is_market_open(now=None):
+    now = _now(now)
+    bounds = session(now.date())
+    return bounds is not None and bounds[0] <= now < bounds[1]
+
+
+def last_close(now=None):
+    now = _now(now)
+    d = now.date()
+    while True:
+        bounds = session(d)
+        if bounds is not None and bounds[1] <= now:
+            return bounds[1]
+        d -= timedelta(days=1)
+
+
+def next_open(now=None):
+    now = _now(now)
+    d = now.date()
+    while True:
+        bounds = session(d)
+        if bounds is not None and bounds[0] > now:
+            return bounds[0]
+        d += timedelta(days=1)
+
+
+def snapshot_ttl(open_ttl, now=None):
+    # 開盤中用 open_ttl；收盤後抓一次結算價，之後整晚沿用到下一次開盤
+    now = _now(now)
+    if is_market_open(now):
+        return open_ttl
+    settled_at = last_close(now) + timedelta(seconds=SETTLE_SECONDS)
+    if now < settled_at:
+        return max((settled_at - now).total_seconds(), open_ttl)
+    return max((next_open(now) - now).total_seconds(), open_ttl)
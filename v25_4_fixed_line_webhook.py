@@ -1,72 +1,13 @@
 
-from flask import Flask, request, abort
-from linebot import LineBotApi, WebhookHandler
-from linebot.exceptions import InvalidSignatureError
-from linebot.models import MessageEvent, TextMessage, TextSendMessage
-import pandas as pd
-import os, json
-
-signal_df = pd.read_csv("output/daily_signals.csv")
-backtest_df = pd.read_csv("output/backtest_summary.csv")
-
-backtest_df["Symbol"] = backtest_df["Symbol"].str.upper()
-backtest_df["win"] = backtest_df["Return"] > 0
-win_rate_df = backtest_df.groupby("Symbol")["win"].mean().reset_index()
-win_rate_df["win_rate"] = (win_rate_df["win"] * 100).round(2)
-win_rate_df.drop(columns=["win"], inplace=True)
-
-merged_df = signal_df.merge(win_rate_df, on="Symbol", how="left")
-all_symbols = merged_df["Symbol"].unique().tolist()
-
-app = Flask(__name__)
-line_bot_api = LineBotApi(os.environ["YOUR_CHANNEL_ACCESS_TOKEN"])
-handler = WebhookHandler(os.environ["YOUR_CHANNEL_SECRET"])
-
-@app.route("/callback", methods=["POST"])
-def callback():
-    signature = request.headers["X-Line-Signature"]
-    body = request.get_data(as_text=True)
-    try:
-        handler.handle(body, signature)
-    except InvalidSignatureError:
-        abort(400)
-    return "OK"
-
-@handler.add(MessageEvent, message=TextMessage)
-def handle_message(event):
-    text = event.message.text.strip().upper()
-    if text in ["市場", "MARKET"]:
-        reply = "📊 市場資訊功能啟用中（請整合 market.txt 或自定義）"
-    elif text.startswith("查詢"):
-        keyword = text.replace("查詢", "").strip().upper()
-        reply = generate_stock_summary(keyword)
-    elif text.startswith("勝率"):
-        keyword = text.replace("勝率", "").strip().upper()
-        reply = generate_winrate_summary(keyword)
-    elif "前三" in text:
-        reply = generate_top3()
-    else:
-        reply = "請輸入：\n查詢 AAPL\n勝率 TSLA\n推薦前三名\n市場"
-    line_bot_api.reply_message(event.reply_token, TextSendMessage(text=reply))
-
-def generate_stock_summary(symbol):
-    if symbol not in all_symbols:
-        return f"找不到代碼 {symbol} 的分析資料。\n\n可查詢：\n" + "、".join(all_symbols[:15]) + "..."
-    row = merged_df[merged_df["Symbol"] == symbol].iloc[0]
-    return f"""📊 {symbol} 分析：
-技術評估：{row['Signal']}
-回測勝率：{row['win_rate']}%
-"""
-
-def generate_winrate_summary(symbol):
-    if symbol not in all_symbols:
-        return f"查無勝率資料 {symbol}。"
-    row = merged_df[merged_df["Symbol"] == symbol].iloc[0]
-    return f"{symbol} 勝率為 {row['win_rate']}%"
-
-def generate_top3():
-    top3 = win_rate_df.sort_values("win_rate", ascending=False).head(3)
-    return "🏆 回測前三名：\n" + "\n".join([f"{i+1}. {r.Symbol} - {r['win_rate']:.1f}%" for i, r in top3.iterrows()])
-
-if __name__ == "__main__":
-    app.run()
+# 已併入 v27.1_linebot_full_combo.py：所有版本的指令統一由 bot_core.py 的 CommandRouter 處理。
+# 保留這個檔名讓舊的啟動指令照樣能用，資料仍讀 output/ 底下的檔案。
+import os
+import runpy
+
+os.environ.setdefault("SIGNAL_FILE", "output/daily_signals.csv")
+os.environ.setdefault("BACKTEST_FILE", "output/backtest_summary.csv")
+
+app = runpy.run_path(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "v27.1_linebot_full_combo.py"),
+    run_name=__name__,
+)["app"]
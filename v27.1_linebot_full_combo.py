@@ -1,99 +1,81 @@
 
-from flask import Flask, request, abort
-from linebot import LineBotApi, WebhookHandler
+from flask import Flask, request, abort, jsonify
+from linebot import LineBotApi, WebhookParser
 from linebot.exceptions import InvalidSignatureError
-from linebot.models import MessageEvent, TextMessage, TextSendMessage
-import pandas as pd
+from linebot.models import TextSendMessage
 import os
-import yfinance as yf
+from bot_core import add_subscribers, build_reply, data_summary, router
+from line_http_client import get_http_client
+from market_indicator_fetcher import market_cache, provider, breaker
+from market_refresher import MarketRefresher
+from webhook_dispatcher import WebhookDispatcher
+from event_batch import EventBatch, reply_text_group
 
-signal_df = pd.read_csv("daily_signals.csv")
-backtest_df = pd.read_csv("backtest_summary.csv")
+app = Flask(__name__)
+line_bot_api = LineBotApi(os.environ["YOUR_CHANNEL_ACCESS_TOKEN"], http_client=get_http_client())
+parser = WebhookParser(os.environ["YOUR_CHANNEL_SECRET"])
 
-symbol_col = "Symbol" if "Symbol" in backtest_df.columns else "symbol"
-backtest_df[symbol_col] = backtest_df[symbol_col].str.upper()
-backtest_df["win"] = backtest_df["Return"] > 0
-win_rate_df = backtest_df.groupby(symbol_col)["win"].mean().reset_index()
-win_rate_df["win_rate"] = (win_rate_df["win"] * 100).round(2)
-win_rate_df.drop(columns=["win"], inplace=True)
+# 設定 MARKET_REFRESH_SECONDS 後，開盤時段由背景執行緒定時更新市場快取
+MARKET_REFRESH_SECONDS = float(os.environ.get("MARKET_REFRESH_SECONDS", 0))
+market_refresher = MarketRefresher(market_cache, MARKET_REFRESH_SECONDS).start() if MARKET_REFRESH_SECONDS > 0 else None
 
-signal_df["Symbol"] = signal_df["Symbol"].str.upper()
-merged_df = signal_df.merge(win_rate_df, left_on="Symbol", right_on=symbol_col, how="left")
-all_symbols = merged_df["Symbol"].unique().tolist()
+def send_reply(reply_token, text):
+    line_bot_api.reply_message(reply_token, TextSendMessage(text=text))
 
-app = Flask(__name__)
-line_bot_api = LineBotApi(os.environ["YOUR_CHANNEL_ACCESS_TOKEN"])
-handler = WebhookHandler(os.environ["YOUR_CHANNEL_SECRET"])
+def handle_text_group(events):
+    reply_text_group(events, build_reply, send_reply)
+
+# 設定 WEBHOOK_ASYNC=1 後，callback 驗完簽章就把事件交給 worker pool，立刻回 200
+WEBHOOK_ASYNC = os.environ.get("WEBHOOK_ASYNC", "0") == "1"
+dispatcher = WebhookDispatcher(
+    handle_text_group,
+    workers=int(os.environ.get("WEBHOOK_WORKERS", 4)),
+    max_queue=int(os.environ.get("WEBHOOK_QUEUE_SIZE", 100)),
+) if WEBHOOK_ASYNC else None
 
 @app.route("/callback", methods=["POST"])
 def callback():
     signature = request.headers["X-Line-Signature"]
     body = request.get_data(as_text=True)
     try:
-        handler.handle(body, signature)
+        batch = EventBatch.parse(parser, body, signature)
     except InvalidSignatureError:
         abort(400)
+    if batch.user_ids:
+        add_subscribers(batch.user_ids)
+    if dispatcher is None:
+        for events in batch.text_groups():
+            handle_text_group(events)
+    else:
+        dispatcher.submit(batch.text_groups())
     return "OK"
 
-@handler.add(MessageEvent, message=TextMessage)
-def handle_message(event):
-    raw_text = event.message.text
-    text = raw_text.strip().upper()
-    reply = ""
-    if text in ["市場", "MARKET"]:
-        reply = generate_market_summary()
-    elif text.startswith("查詢"):
-        keyword = text.replace("查詢", "").strip().upper()
-        reply = generate_stock_summary(keyword, raw_text)
-    elif text.startswith("勝率"):
-        keyword = text.replace("勝率", "").strip().upper()
-        reply = generate_winrate_summary(keyword)
-    elif "前三" in text:
-        reply = generate_top3()
-    else:
-        reply = f"請輸入：\n市場\n查詢 AAPL\n勝率 TSLA\n推薦前三名\n你輸入的是：{raw_text}"
-    line_bot_api.reply_message(event.reply_token, TextSendMessage(text=reply))
+@app.route("/webhook/stats", methods=["GET"])
+def webhook_stats():
+    if dispatcher is None:
+        return jsonify({"enabled": False})
+    return jsonify({"enabled": True, **dispatcher.stats()})
 
-def generate_market_summary():
-    try:
-        spx = yf.Ticker("^GSPC").history(period="1d")["Close"].iloc[-1]
-        ndx = yf.Ticker("^IXIC").history(period="1d")["Close"].iloc[-1]
-        vix = yf.Ticker("^VIX").history(period="1d")["Close"].iloc[-1]
-        dxy = yf.Ticker("DX-Y.NYB").history(period="1d")["Close"].iloc[-1]
-        tn = yf.Ticker("^TNX").history(period="1d")["Close"].iloc[-1] / 10
-        return f"""📊 今日市場概況：
-S&P500：{spx:.2f}
-NASDAQ：{ndx:.2f}
-VIX：{vix:.2f}
-DXY：{dxy:.2f}
-10Y殖利率：{tn:.2f}%
-"""
-    except Exception as e:
-        return f"❗ 無法取得市場資訊：{e}"
+@app.route("/line/stats", methods=["GET"])
+def line_stats():
+    return jsonify(line_bot_api.http_client.stats())
 
-def generate_stock_summary(symbol, raw):
-    if symbol not in all_symbols:
-        preview = "、".join(all_symbols[:10])
-        return f"""❗ 查詢失敗
-輸入文字：{raw}
-轉換代碼：{symbol}
-目前可查前10名：{preview}
-"""
-    row = merged_df[merged_df["Symbol"] == symbol].iloc[0]
-    return f"""📊 {symbol} 分析：
-技術評估：{row['Signal']}
-回測勝率：{row['win_rate']}%
-"""
+@app.route("/commands/stats", methods=["GET"])
+def command_stats():
+    return jsonify(router.stats())
 
-def generate_winrate_summary(symbol):
-    if symbol not in all_symbols:
-        return f"查無勝率資料：{symbol}"
-    row = merged_df[merged_df["Symbol"] == symbol].iloc[0]
-    return f"{symbol} 勝率為 {row['win_rate']}%"
+@app.route("/data/stats", methods=["GET"])
+def data_stats():
+    return jsonify(data_summary())
 
-def generate_top3():
-    top3 = win_rate_df.sort_values("win_rate", ascending=False).head(3)
-    return "🏆 回測前三名：\n" + "\n".join([f"{i+1}. {r[symbol_col]} - {r['win_rate']:.1f}%" for i, r in top3.iterrows()])
+@app.route("/market/stats", methods=["GET"])
+def market_stats():
+    stats = {"enabled": market_refresher is not None, "cache_age": market_cache.age()}
+    if market_refresher is not None:
+        stats.update(market_refresher.stats())
+    stats["provider"] = provider.stats()
+    stats["breaker"] = breaker.stats()
+    return jsonify(stats)
 
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=int(os.environ.get("PORT", 5000)))
@@ -0,0 +1,192 @@
+
+import asyncio
+import json
+import os
+import time
+
+import aiohttp
+from linebot import AsyncLineBotApi, WebhookParser
+from linebot.aiohttp_async_http_client import AiohttpAsyncHttpClient
+from linebot.exceptions import InvalidSignatureError
+from linebot.models import TextSendMessage
+
+from bot_core import add_subscribers, build_reply_async, data_summary, router
+from event_batch import EventBatch, group_user_ids, reply_for
+from line_http_client import KEEPALIVE_SECONDS, POOL_SIZE, CallStats, aiohttp_trace_config
+from market_indicator_fetcher import breaker, market_cache, provider
+from market_refresher import MarketRefresher
+
+# v27.1 的 asyncio 版：指令與回覆內容相同（都來自 bot_core），
+# LINE 回覆走 aiohttp，市場資料用 get_market_snapshot_async，一個行程就能同時處理大量對話。
+# 啟動：uvicorn v28_asgi_linebot:app --host 0.0.0.0 --port $PORT
+# 報價設 QUOTE_PROVIDER=yahoo 才是真正的非同步 HTTP；yfinance 會改丟到執行緒跑。
+
+parser = WebhookParser(os.environ["YOUR_CHANNEL_SECRET"])
+CHANNEL_ACCESS_TOKEN = os.environ["YOUR_CHANNEL_ACCESS_TOKEN"]
+
+# 設定 MARKET_REFRESH_SECONDS 後，開盤時段由背景執行緒定時更新市場快取
+MARKET_REFRESH_SECONDS = float(os.environ.get("MARKET_REFRESH_SECONDS", 0))
+market_refresher = MarketRefresher(market_cache, MARKET_REFRESH_SECONDS).start() if MARKET_REFRESH_SECONDS > 0 else None
+
+# aiohttp 的 session 要在 event loop 裡建立，所以等 lifespan startup 才初始化
+line_bot_api = None
+_session = None
+_tasks = set()
+line_call_stats = CallStats()
+_stats = {"accepted": 0, "processed": 0, "failed": 0, "max_in_flight": 0, "total_handle": 0.0}
+
+
+async def send_reply(reply_token, text):
+    await line_bot_api.reply_message(reply_token, TextSendMessage(text=text))
+
+
+async def handle_text_group(events):
+    # 同一批裡文字相同的訊息只產生一次回覆，再分別用各自的 reply token 回
+    start = time.monotonic()
+    try:
+        reply = await build_reply_async(events[0].message.text, group_user_ids(events))
+        targets = [(e.reply_token, reply_for(reply, e)) for e in events]
+        results = await asyncio.gather(*(send_reply(token, text) for token, text in targets if text), return_exceptions=True)
+        errors = [r for r in results if isinstance(r, Exception)]
+        for e in errors:
+            print("❌ 回覆失敗：", e)
+    except Exception as e:
+        # 產生回覆失敗（例如關注清單寫 SQLite 出錯）：和 WebhookDispatcher 一樣記下來，不讓例外留在 task 裡沒人接
+        errors = [e]
+        print("❌ 事件處理失敗：", e)
+    _stats["processed"] += 1
+    _stats["failed"] += 1 if errors else 0
+    _stats["total_handle"] += time.monotonic() - start
+
+
+def _spawn(coro):
+    task = asyncio.ensure_future(coro)
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    _stats["accepted"] += 1
+    _stats["max_in_flight"] = max(_stats["max_in_flight"], len(_tasks))
+
+
+async def callback(headers, body):
+    signature = headers.get("x-line-signature")
+    if signature is None:
+        return 400, "Bad Request"
+    try:
+        batch = EventBatch.parse(parser, body.decode("utf-8"), signature)
+    except InvalidSignatureError:
+        return 400, "Bad Request"
+    if batch.user_ids:
+        # 寫 SQLite（沒有背景 flush 時會當場寫入）會卡住 event loop，丟到執行緒做
+        await asyncio.to_thread(add_subscribers, batch.user_ids)
+    # 驗完簽章就回 200，回覆在背景 task 裡做
+    for events in batch.text_groups():
+        _spawn(handle_text_group(events))
+    return 200, "OK"
+
+
+def webhook_stats():
+    done = _stats["processed"] or 1
+    return {
+        "enabled": True,
+        "mode": "asyncio",
+        "in_flight": len(_tasks),
+        "max_in_flight": _stats["max_in_flight"],
+        "accepted": _stats["accepted"],
+        "processed": _stats["processed"],
+        "failed": _stats["failed"],
+        "avg_handle": _stats["total_handle"] / done,
+    }
+
+
+def line_stats():
+    return {"backend": "aiohttp", "pool_size": POOL_SIZE, **line_call_stats.stats()}
+
+
+def market_stats():
+    stats = {"enabled": market_refresher is not None, "cache_age": market_cache.age()}
+    if market_refresher is not None:
+        stats.update(market_refresher.stats())
+    stats["provider"] = provider.stats()
+    stats["breaker"] = breaker.stats()
+    return stats
+
+
+async def startup():
+    global line_bot_api, _session
+    # LINE API 連線共用、keep-alive，延遲與連線重用率記在 line_call_stats
+    _session = aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit=POOL_SIZE, keepalive_timeout=KEEPALIVE_SECONDS),
+        trace_configs=[aiohttp_trace_config(line_call_stats)],
+    )
+    line_bot_api = AsyncLineBotApi(CHANNEL_ACCESS_TOKEN, AiohttpAsyncHttpClient(_session))
+
+
+async def shutdown(timeout=30):
+    # 等還在處理的回覆送完再關連線
+    if _tasks:
+        await asyncio.wait(set(_tasks), timeout=timeout)
+    await provider.aclose()
+    if _session is not None:
+        await _session.close()
+
+
+async def _read_body(receive):
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body", False):
+            return body
+
+
+async def _respond(send, status, payload):
+    if isinstance(payload, str):
+        body, content_type = payload.encode("utf-8"), b"text/plain; charset=utf-8"
+    else:
+        body, content_type = json.dumps(payload, ensure_ascii=False).encode("utf-8"), b"application/json"
+    await send({"type": "http.response.start", "status": status, "headers": [(b"content-type", content_type)]})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await startup()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await shutdown()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+GET_ROUTES = {
+    "/webhook/stats": webhook_stats,
+    "/line/stats": line_stats,
+    "/commands/stats": router.stats,
+    "/data/stats": data_summary,
+    "/market/stats": market_stats,
+}
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await _lifespan(receive, send)
+        return
+    if scope["type"] != "http":
+        return
+    method, path = scope["method"], scope["path"]
+    if method == "POST" and path == "/callback":
+        headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope["headers"]}
+        status, payload = await callback(headers, await _read_body(receive))
+    elif method == "GET" and path in GET_ROUTES:
+        status, payload = 200, GET_ROUTES[path]()
+    else:
+        status, payload = 404, "Not Found"
+    await _respond(send, status, payload)
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app, host="0.0.0.0", port=int(os.environ.get("PORT", 5000)))
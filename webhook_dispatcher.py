@@ -0,0 +1,105 @@
+
+import atexit
+import queue
+import threading
+import time
+
+_STOP = object()
+
+
+class WebhookDispatcher:
+    # callback 驗完簽章就把事件丟進佇列、立刻回 200，由固定數量的 worker 處理
+    # 佇列滿了就在請求執行緒裡直接處理，讓 LINE 端自然慢下來（backpressure）
+    def __init__(self, handle_event, workers=4, max_queue=100):
+        self.handle_event = handle_event
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._closed = False
+        self.accepted = 0
+        self.inline = 0
+        self.processed = 0
+        self.failed = 0
+        self.max_depth = 0
+        self.total_wait = 0.0
+        self.total_handle = 0.0
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"webhook-worker-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for t in self._threads:
+            t.start()
+        atexit.register(self.shutdown)
+
+    def submit(self, events):
+        for event in events:
+            # 檢查 closed 和放進佇列在同一把鎖內，shutdown 放 _STOP 之後就不會再有事件排在後面沒人處理
+            with self._lock:
+                if not self._closed:
+                    try:
+                        self._queue.put_nowait((event, time.monotonic()))
+                        self.accepted += 1
+                        self.max_depth = max(self.max_depth, self._queue.qsize())
+                        continue
+                    except queue.Full:
+                        pass
+                self.inline += 1
+            # 佇列滿了或已經關閉：在請求執行緒裡直接處理
+            self._handle(event, time.monotonic())
+
+    def _worker(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is _STOP:
+                    return
+                self._handle(*item)
+            finally:
+                self._queue.task_done()
+
+    def _handle(self, event, enqueued_at):
+        start = time.monotonic()
+        try:
+            self.handle_event(event)
+            ok = True
+        except Exception as e:
+            ok = False
+            print("❌ 事件處理失敗：", e)
+        end = time.monotonic()
+        with self._lock:
+            self.processed += 1
+            self.failed += 0 if ok else 1
+            self.total_wait += start - enqueued_at
+            self.total_handle += end - start
+
+    def shutdown(self, timeout=30):
+        # 不再收新事件，等佇列裡的事件處理完再結束；整個過程最多 timeout 秒
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        deadline = time.monotonic() + timeout
+        for _ in self._threads:
+            try:
+                self._queue.put(_STOP, timeout=max(deadline - time.monotonic(), 0))
+            except queue.Full:
+                break  # worker 都是 daemon，來不及處理的就隨行程結束
+        for t in self._threads:
+            t.join(max(deadline - time.monotonic(), 0))
+        if self._queue.qsize():
+            print(f"⚠️ 關閉時還有 {self._queue.qsize()} 個事件沒處理")
+
+    def stats(self):
+        done = self.processed or 1
+        return {
+            "workers": len(self._threads),
+            "queue_depth": self._queue.qsize(),
+            "queue_limit": self._queue.maxsize,
+            "max_depth": self.max_depth,
+            "accepted": self.accepted,
+            "inline": self.inline,
+            "processed": self.processed,
+            "failed": self.failed,
+            "avg_wait": self.total_wait / done,
+            "avg_handle": self.total_handle / done,
+            "closed": self._closed,
+        }